@@ -1,30 +1,26 @@
-from numpy import Inf
-from utils import reconstruct_path, dist, get_neighborhood, line_of_sight
+from numpy import inf as Inf
+from utils import reconstruct_path, interpolate_path, dist, get_edges, line_of_sight, segment_cost, MOVES, OpenSet
 
 
-def Dijkstra(grid, wall, goal, frontier, inner, g_score, come_from):
-	curr = next(iter(frontier))
-
-	# choose as current the node with higher G score (the closer to reach)
-	for node in frontier:
-		if g_score[node] < g_score[curr]:
-			curr = node
+def Dijkstra(occupancy, goal, frontier, inner, g_score, come_from, table=None, terrain=None):
+	# terrain: optional cost of each cell, applied to the moves (see utils.edge_cost)
+	# choose as current the node with lower G score (the closer to reach)
+	curr = frontier.pop()
 
 	# check if it is the  goal
 	if curr == goal:
 		path = reconstruct_path(curr, come_from)
 		return None, None, None, path
 
-	# switch the selected node from frontier to inner set
-	frontier.discard(curr)
+	# the selected node has already left the frontier: move it to the inner set
 	inner.add(curr)
 
-	# get all the nodes adjacent to the current one
-	neighborhood = get_neighborhood(curr, grid, wall)
+	# get all the nodes adjacent to the current one, with the cost of the move
+	neighborhood = get_edges(curr, occupancy, table, terrain)
 
-	for neighbour in neighborhood:
+	for neighbour, cost in neighborhood:
 		# if a node is reachable for the first time, initialize its G score to Inf
-		if neighbour not in g_score.keys():
+		if neighbour not in g_score:
 			g_score[neighbour] = Inf
 
 		# skip the inner nodes
@@ -32,69 +28,62 @@ def Dijkstra(grid, wall, goal, frontier, inner, g_score, come_from):
 			continue
 
 		# compute the new G score
-		new_gScore = g_score[curr] + dist(curr, neighbour)
+		new_gScore = g_score[curr] + cost
 
 		# if a shorter path to reach the neighbour has been found --> update its G score
 		if new_gScore < g_score[neighbour]:
 			come_from[neighbour] = curr
 			g_score[neighbour] = new_gScore
-			if neighbour not in frontier:
-				frontier.add(neighbour)
+			frontier.push(neighbour, new_gScore)
 
 	return frontier, inner, g_score, come_from
 
 
-def greed_best_first(grid, wall, goal, h, frontier, inner, come_from):
-	curr = next(iter(frontier))
-	# choose as current the node with higher heuristic value (euclidean distance from goal)
-	for node in frontier:
-		if h[node] < h[curr]:
-			curr = node
+def greed_best_first(occupancy, goal, h, frontier, inner, come_from, table=None):
+	# choose as current the node with lower heuristic value (euclidean distance from goal)
+	curr = frontier.pop()
 
 	# check if it is the goal
 	if curr == goal:
 		path = reconstruct_path(curr, come_from)
 		return None, None, path
 
-	# switch the selected node from frontier to inner set
-	frontier.discard(curr)
+	# the selected node has already left the frontier: move it to the inner set
 	inner.add(curr)
 
 	# get all the nodes adjacent to the current one
-	neighborhood = get_neighborhood(curr, grid, wall)
+	neighborhood = get_edges(curr, occupancy, table)
 
-	for neighbour in neighborhood:
+	for neighbour, _ in neighborhood:
 		# if a node is reachable for the first time, add it to the frontier
 		if (neighbour not in inner) and (neighbour not in frontier):
-			frontier.add(neighbour)
+			frontier.push(neighbour, h[neighbour])
 			come_from[neighbour] = curr
 
 	return frontier, inner, come_from
 
 
-def A_star(grid, wall, goal, h, frontier, inner, g_score, f_score, come_from):
-	curr = next(iter(frontier))
-
-	# choose as current the node with the higher F score, where F(n) = G(n) + H(n)
-	for node in frontier:
-		if f_score[node] < f_score[curr]:
-			curr = node
+def A_star(occupancy, goal, h, frontier, inner, g_score, f_score, come_from, table=None, w=1, terrain=None):
+	# w: weight of the heuristic (weighted A*, F(n) = G(n) + w * H(n)): the path is at most w times longer than the
+	# shortest one, and w > 1 expands fewer nodes
+	# terrain: optional cost of each cell, applied to the moves (see utils.edge_cost)
+	# choose as current the node with the lower F score, where F(n) = G(n) + H(n)
+	curr = frontier.pop()
 
 	# check if it is the goal
 	if curr == goal:
 		path = reconstruct_path(curr, come_from)
 		return None, None, None, path
 
-	# switch the selected node from frontier to inner set
-	frontier.discard(curr)
+	# the selected node has already left the frontier: move it to the inner set
 	inner.add(curr)
 
-	# get all the nodes adjacent to the current one
-	neighborhood = get_neighborhood(curr, grid, wall)
+	# get all the nodes adjacent to the current one, with the cost of the move
+	neighborhood = get_edges(curr, occupancy, table, terrain)
 
-	for neighbour in neighborhood:
+	for neighbour, cost in neighborhood:
 		# if a node is reachable for the first time, initialize its G score to Inf
-		if neighbour not in g_score.keys():
+		if neighbour not in g_score:
 			g_score[neighbour] = Inf
 
 		# skip the inner nodes
@@ -102,42 +91,89 @@ def A_star(grid, wall, goal, h, frontier, inner, g_score, f_score, come_from):
 			continue
 
 		# compute the new G score
-		new_gScore = g_score[curr] + dist(curr, neighbour)
+		new_gScore = g_score[curr] + cost
 
 		# if a shorter path to reach the neighbour has been found --> update its F score
 		if new_gScore < g_score[neighbour]:
 			come_from[neighbour] = curr
 			g_score[neighbour] = new_gScore
-			f_score[neighbour] = new_gScore + h[neighbour]
-			if neighbour not in frontier:
-				frontier.add(neighbour)
+			f_score[neighbour] = new_gScore + w * h[neighbour]
+			frontier.push(neighbour, f_score[neighbour])
+
+	return frontier, inner, g_score, come_from
+
+
+def ARA_star(occupancy, goal, h, frontier, inner, g_score, f_score, come_from, incons, w, table=None, terrain=None):
+	# one step of an iteration of ARA* (anytime repairing A*): a weighted A* with F(n) = G(n) + w * H(n) whose
+	# iteration ends when no node of the frontier can improve the path to the goal, i.e. G(goal) <= min F
+	if goal in g_score and g_score[goal] <= frontier.min_priority():
+		path = reconstruct_path(goal, come_from)
+		return None, None, None, path
+
+	curr = frontier.pop()
+	inner.add(curr)
+
+	for neighbour, cost in get_edges(curr, occupancy, table, terrain):
+		if neighbour not in g_score:
+			g_score[neighbour] = Inf
+
+		new_gScore = g_score[curr] + cost
+		if new_gScore < g_score[neighbour]:
+			come_from[neighbour] = curr
+			g_score[neighbour] = new_gScore
+			f_score[neighbour] = new_gScore + w * h[neighbour]
+			# a node already expanded in this iteration is not expanded again: it waits for the next one
+			if neighbour in inner:
+				incons.add(neighbour)
+			else:
+				frontier.push(neighbour, f_score[neighbour])
 
 	return frontier, inner, g_score, come_from
 
 
-def Theta_star(grid, wall, start, goal, h, frontier, inner, g_score, f_score, come_from):
-	curr = next(iter(frontier))
+def ARA_star_restart(h, frontier, inner, g_score, f_score, incons, w):
+	# start the next iteration of ARA* with the (smaller) weight w: the inconsistent nodes go back to the frontier,
+	# whose F scores are recomputed, and the inner set is emptied
+	for node in list(frontier) + list(incons):
+		f_score[node] = g_score[node] + w * h[node]
+		frontier.push(node, f_score[node])
+	incons.clear()
+	inner.clear()
+
+
+def ARA_bound(goal, h, frontier, g_score, incons, w):
+	# suboptimality bound of the path found with the weight w: at most w, and at most G(goal) / min(G(n) + H(n))
+	# over the frontier and the inconsistent nodes (a lower bound of the shortest path length)
+	lower = min([g_score[node] + h[node] for node in frontier] + [g_score[node] + h[node] for node in incons],
+				default=Inf)
+	if lower == Inf:
+		return 1  # no node left to expand: the path is the shortest one
+	return min(w, max(g_score[goal] / lower, 1)) if lower > 0 else w
+
 
-	# choose as current the node with the higher F score, where F(n) = G(n) + H(n)
-	for node in frontier:
-		if f_score[node] < f_score[curr]:
-			curr = node
+def Theta_star(occupancy, start, goal, h, frontier, inner, g_score, f_score, come_from, table=None, sight=None,
+		terrain=None):
+	# sight: optional SightCache of the map, to reuse the line of sight checks already done
+	# terrain: optional cost of each cell, applied to the moves and to the segments (see utils.segment_cost)
+	visible = line_of_sight if sight is None else sight.line_of_sight
+
+	# choose as current the node with the lower F score, where F(n) = G(n) + H(n)
+	curr = frontier.pop()
 
 	# check if it is the goal
 	if curr == goal:
 		path = reconstruct_path(curr, come_from)
 		return None, None, None, path
 
-	# switch the selected node from frontier to inner set
-	frontier.discard(curr)
+	# the selected node has already left the frontier: move it to the inner set
 	inner.add(curr)
 
-	# get all the nodes adjacent to the current one
-	neighborhood = get_neighborhood(curr, grid, wall)
+	# get all the nodes adjacent to the current one, with the cost of the move
+	neighborhood = get_edges(curr, occupancy, table, terrain)
 
-	for neighbour in neighborhood:
+	for neighbour, cost in neighborhood:
 		# if a node is reachable for the first time, initialize its G score to Inf
-		if neighbour not in g_score.keys():
+		if neighbour not in g_score:
 			g_score[neighbour] = Inf
 			come_from[neighbour] = curr
 
@@ -146,27 +182,295 @@ def Theta_star(grid, wall, start, goal, h, frontier, inner, g_score, f_score, co
 			continue
 
 		# store the parent of the current node
-		parent_curr = come_from[curr] if curr is not start else start
+		parent_curr = come_from[curr] if curr != start else start
 
 		# check if the neighbor (n) is reachable from the parent of the current node (parent_curr)
-		if line_of_sight(parent_curr, neighbour, wall):
+		if terrain is None:
+			shortcut = dist(parent_curr, neighbour) if visible(parent_curr, neighbour, occupancy) else Inf
+		else:
+			# on a terrain the segment costs depend on the cells crossed: keep it only if it is cheaper than via curr
+			shortcut = segment_cost(parent_curr, neighbour, occupancy, terrain)
+			if g_score[parent_curr] + shortcut > g_score[curr] + cost + 1e-9:  # (up to the rounding errors)
+				shortcut = Inf
+		if shortcut < Inf:
 			# compute the new G score for n, considering it reachable from parent_curr
-			new_gScore = g_score[parent_curr] + dist(parent_curr, neighbour)
+			new_gScore = g_score[parent_curr] + shortcut
 			# if the path from parent_curr --> n is shorter then curr --> n, update the F score accordingly
 			if new_gScore < g_score[neighbour]:
 				g_score[neighbour] = new_gScore
 				f_score[neighbour] = new_gScore + h[neighbour]
 				come_from[neighbour] = parent_curr
-				frontier.add(neighbour)
+				frontier.push(neighbour, f_score[neighbour])
 		# the neighbor (n) is not reachable from parent_curr, then execute the standard F score update (as A*)
 		else:
-			new_gScore = g_score[curr] + dist(curr, neighbour)
+			new_gScore = g_score[curr] + cost
 			if new_gScore < g_score[neighbour]:
 				g_score[neighbour] = new_gScore
 				f_score[neighbour] = new_gScore + h[neighbour]
 				come_from[neighbour] = curr
-				frontier.add(neighbour)
+				frontier.push(neighbour, f_score[neighbour])
 
 	return frontier, inner, g_score, come_from
 
 
+def jump_point_search(occupancy, goal, h, frontier, inner, g_score, f_score, come_from):
+	# choose as current the jump point with the lower F score, where F(n) = G(n) + H(n)
+	curr = frontier.pop()
+
+	# check if it is the goal: fill the straight segments between the jump points
+	if curr == goal:
+		path = interpolate_path(reconstruct_path(curr, come_from))
+		return None, None, None, path
+
+	# the selected node has already left the frontier: move it to the inner set
+	inner.add(curr)
+
+	# instead of the adjacent nodes, consider the jump points reachable along the not pruned directions
+	for direction in jump_directions(occupancy, curr, come_from[curr]):
+		neighbour = jump(occupancy, curr, direction, goal)
+
+		# skip the directions without jump points and the inner nodes
+		if neighbour is None or neighbour in inner:
+			continue
+
+		# if a node is reachable for the first time, initialize its G score to Inf
+		if neighbour not in g_score:
+			g_score[neighbour] = Inf
+
+		# the jump is a straight or diagonal segment: its cost is the euclidean distance
+		new_gScore = g_score[curr] + dist(curr, neighbour)
+
+		# if a shorter path to reach the jump point has been found --> update its F score
+		if new_gScore < g_score[neighbour]:
+			come_from[neighbour] = curr
+			g_score[neighbour] = new_gScore
+			f_score[neighbour] = new_gScore + h[neighbour]
+			frontier.push(neighbour, f_score[neighbour])
+
+	return frontier, inner, g_score, come_from
+
+
+def is_free(occupancy, x, y):
+	return 0 <= x < occupancy.shape[0] and 0 <= y < occupancy.shape[1] and not occupancy[x, y]
+
+
+def jump_directions(occupancy, curr, parent):
+	# the start node has no parent: search in all the directions
+	if parent is None:
+		return MOVES
+
+	x, y = curr
+	dx = (x > parent[0]) - (x < parent[0])
+	dy = (y > parent[1]) - (y < parent[1])
+
+	# natural directions, plus the forced ones that turn around a wall next to the current node
+	if dx and dy:
+		directions = [(dx, 0), (0, dy), (dx, dy)]
+		if not is_free(occupancy, x - dx, y):
+			directions.append((-dx, dy))
+		if not is_free(occupancy, x, y - dy):
+			directions.append((dx, -dy))
+	elif dx:
+		directions = [(dx, 0)]
+		if not is_free(occupancy, x, y + 1):
+			directions.append((dx, 1))
+		if not is_free(occupancy, x, y - 1):
+			directions.append((dx, -1))
+	else:
+		directions = [(0, dy)]
+		if not is_free(occupancy, x + 1, y):
+			directions.append((1, dy))
+		if not is_free(occupancy, x - 1, y):
+			directions.append((-1, dy))
+	return directions
+
+
+def jump(occupancy, cell, direction, goal):
+	x, y = cell
+	dx, dy = direction
+	while True:
+		x, y = x + dx, y + dy
+		if not is_free(occupancy, x, y):
+			return None
+		if (x, y) == goal:
+			return x, y
+
+		# a node with a forced neighbour is a jump point
+		if dx and dy:
+			if (not is_free(occupancy, x - dx, y) and is_free(occupancy, x - dx, y + dy)) or \
+					(not is_free(occupancy, x, y - dy) and is_free(occupancy, x + dx, y - dy)):
+				return x, y
+			# moving diagonally, a node is also a jump point if a straight jump starts from it
+			if jump(occupancy, (x, y), (dx, 0), goal) is not None or jump(occupancy, (x, y), (0, dy), goal) is not None:
+				return x, y
+		elif dx:
+			if (not is_free(occupancy, x, y + 1) and is_free(occupancy, x + dx, y + 1)) or \
+					(not is_free(occupancy, x, y - 1) and is_free(occupancy, x + dx, y - 1)):
+				return x, y
+		else:
+			if (not is_free(occupancy, x + 1, y) and is_free(occupancy, x + 1, y + dy)) or \
+					(not is_free(occupancy, x - 1, y) and is_free(occupancy, x - 1, y + dy)):
+				return x, y
+
+
+def bidirectional_search(occupancy, forward, backward, meeting, table=None, terrain=None):
+	"""
+	One expansion of a search from the start (forward) and one from the goal (backward), meeting in the middle.
+	forward and backward hold 'h', 'frontier', 'inner', 'g_score', 'f_score' and 'come_from' of each search;
+	meeting holds the cost of the shortest path found so far, its 'edge' (forward node, backward node) and the
+	'offset' of the stopping condition. Without heuristic (h = 0, offset = 0) this is the bidirectional Dijkstra;
+	the bidirectional A* uses the balanced heuristics h = (h_goal - h_start) / 2 forward and its opposite backward,
+	both shifted by offset / 2 = h_goal(start) / 2, so that the two searches agree on the cost of every path.
+	terrain: optional cost of each cell, applied to the moves (see utils.edge_cost).
+	"""
+	# no path shorter than the meeting one exists once the best frontier nodes of the two searches are too far apart
+	def stop():
+		return forward['frontier'].min_priority() + backward['frontier'].min_priority() >= \
+			meeting['cost'] + meeting['offset']
+
+	# the start is the goal
+	if stop():
+		return join_searches(forward, backward, meeting)
+
+	# expand the search with the smaller frontier
+	if len(forward['frontier']) <= len(backward['frontier']):
+		side, other = forward, backward
+	else:
+		side, other = backward, forward
+	g_score, f_score, come_from = side['g_score'], side['f_score'], side['come_from']
+
+	curr = side['frontier'].pop()
+	side['inner'].add(curr)
+
+	# get all the nodes adjacent to the current one, with the cost of the move
+	neighborhood = get_edges(curr, occupancy, table, terrain)
+
+	for neighbour, cost in neighborhood:
+		# if the neighbour has been reached by the other search, a path through this edge exists
+		if neighbour in other['g_score']:
+			meeting_cost = g_score[curr] + cost + other['g_score'][neighbour]
+			if meeting_cost < meeting['cost']:
+				meeting['cost'] = meeting_cost
+				meeting['edge'] = (curr, neighbour) if side is forward else (neighbour, curr)
+
+		# if a node is reachable for the first time, initialize its G score to Inf
+		if neighbour not in g_score:
+			g_score[neighbour] = Inf
+
+		# skip the inner nodes
+		if neighbour in side['inner']:
+			continue
+
+		# if a shorter path to reach the neighbour has been found --> update its F score
+		new_gScore = g_score[curr] + cost
+		if new_gScore < g_score[neighbour]:
+			come_from[neighbour] = curr
+			g_score[neighbour] = new_gScore
+			f_score[neighbour] = new_gScore + side['h'][neighbour]
+			side['frontier'].push(neighbour, f_score[neighbour])
+
+	# check if the shortest path has been found, or if a search has run out of nodes
+	if stop() or len(forward['frontier']) == 0 or len(backward['frontier']) == 0:
+		return join_searches(forward, backward, meeting)
+
+	return forward, backward, meeting
+
+
+def join_searches(forward, backward, meeting):
+	# the searches have not met: there is no path, empty the frontier so that the caller stops
+	if meeting['edge'] is None:
+		forward['frontier'] = OpenSet()
+		return forward, backward, meeting
+
+	# join the two half paths at the meeting edge
+	node_forward, node_backward = meeting['edge']
+	path = reconstruct_path(node_forward, forward['come_from'])
+	path_backward = reconstruct_path(node_backward, backward['come_from'])[::-1]
+	path += path_backward[1:] if node_forward == node_backward else path_backward
+	return None, None, None, path
+
+
+def LPA_star(occupancy, start, goal, h, frontier, inner, g_score, rhs, table=None, terrain=None):
+	"""
+	One expansion of Lifelong Planning A*. g_score holds the G scores of the last expansions, rhs the one-step
+	lookahead values (min over the predecessors p of G(p) + dist(p, n)); a node is in the frontier while the two differ.
+	The state is kept between runs: after a change of the walls, LPA_star_update repairs only the affected nodes.
+	"""
+	# check if the path is up to date: no node in the frontier can still improve the goal
+	if len(frontier) == 0 or not LPA_key_less(frontier.min_priority(), LPA_key(goal, h, g_score, rhs)):
+		if rhs.get(goal, Inf) == g_score.get(goal, Inf) < Inf:
+			path = LPA_path(occupancy, start, goal, g_score, table, terrain)
+			return None, None, None, path
+		if len(frontier) == 0:
+			return frontier, inner, g_score, rhs
+
+	# choose as current the node with the lower key, (F(n), G(n)) with G(n) = min(G(n), rhs(n))
+	curr = frontier.pop()
+	inner.add(curr)
+
+	if g_score.get(curr, Inf) > rhs.get(curr, Inf):
+		# overconsistent node: a shorter path has been found, propagate it to the neighbours
+		g_score[curr] = rhs[curr]
+		for neighbour, _ in get_edges(curr, occupancy, table):
+			LPA_update_vertex(occupancy, start, neighbour, h, frontier, g_score, rhs, table, terrain)
+	else:
+		# underconsistent node: its path got longer (e.g. a wall), reset it and its neighbours
+		g_score[curr] = Inf
+		LPA_update_vertex(occupancy, start, curr, h, frontier, g_score, rhs, table, terrain)
+		for neighbour, _ in get_edges(curr, occupancy, table):
+			LPA_update_vertex(occupancy, start, neighbour, h, frontier, g_score, rhs, table, terrain)
+
+	# the callers stop on an empty frontier: if this expansion has emptied it, the goal may already be consistent
+	if len(frontier) == 0 and rhs.get(goal, Inf) == g_score.get(goal, Inf) < Inf:
+		path = LPA_path(occupancy, start, goal, g_score, table, terrain)
+		return None, None, None, path
+
+	return frontier, inner, g_score, rhs
+
+
+def LPA_key(node, h, g_score, rhs):
+	g = min(g_score.get(node, Inf), rhs.get(node, Inf))
+	return g + h[node], g
+
+
+def LPA_key_less(key, other, tolerance=1e-9):
+	# F scores that differ only by rounding errors (e.g. sums of sqrt(2) in a different order) are equal: compare the G
+	if abs(key[0] - other[0]) > tolerance:
+		return key[0] < other[0]
+	return key[1] < other[1] - tolerance
+
+
+def LPA_update_vertex(occupancy, start, node, h, frontier, g_score, rhs, table=None, terrain=None):
+	# recompute the lookahead value of the node (a wall cannot be reached)
+	if node != start:
+		if occupancy[node]:
+			rhs[node] = Inf
+		else:
+			rhs[node] = min([g_score.get(neighbour, Inf) + cost
+							for neighbour, cost in get_edges(node, occupancy, table, terrain)], default=Inf)
+
+	# the node belongs to the frontier only while it is inconsistent
+	frontier.discard(node)
+	if g_score.get(node, Inf) != rhs.get(node, Inf):
+		frontier.push(node, LPA_key(node, h, g_score, rhs))
+
+
+def LPA_star_update(occupancy, start, h, frontier, g_score, rhs, cells, table=None, terrain=None):
+	# a cell that became (or stopped being) a wall, or whose terrain cost changed, changes the cost of the edges to
+	# its neighbours
+	height, width = occupancy.shape
+	for x, y in cells:
+		for dx, dy in ((0, 0),) + MOVES:
+			if 0 <= x + dx < height and 0 <= y + dy < width:
+				LPA_update_vertex(occupancy, start, (x + dx, y + dy), h, frontier, g_score, rhs, table, terrain)
+	return frontier, g_score, rhs
+
+
+def LPA_path(occupancy, start, goal, g_score, table=None, terrain=None):
+	# walk back from the goal, moving each time to the neighbour on a shortest path
+	path = [goal]
+	curr = goal
+	while curr != start:
+		curr = min(get_edges(curr, occupancy, table, terrain), key=lambda edge: g_score.get(edge[0], Inf) + edge[1])[0]
+		path.append(curr)
+	return path[::-1]
@@ -0,0 +1,182 @@
+"""
+Headless benchmark of the planners on reproducible maps.
+Example: python benchmark.py -maps random maze -sizes 64 128 -queries 5 -csv results.csv -json results.json
+With -scen, every query of a MovingAI scenario is run instead (maps are read next to the .scen file, or from -map):
+python benchmark.py -scen arena.map.scen -algorithms A_star JPS -csv arena.csv
+"""
+import argparse
+import csv
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+from engine import plan, plan_many, ALGORITHMS
+from hpa import HierarchicalMap
+from parallel import plan_parallel
+from maps import GENERATORS, load_movingai_map, load_movingai_scen, random_queries
+from utils import NeighbourTable, heuristic_field
+
+ENGINES = ('dict', 'table', 'flat')  # search state in dicts, + precomputed neighbour table, + flat buffers
+FIELDS = ('map', 'size', 'query', 'start', 'goal', 'algo', 'engine', 'time', 'steps', 'peak_memory', 'length',
+          'optimal', 'suboptimality')
+
+
+def run_query(occupancy, start, goal, algorithm, engine, table, hierarchy=None):
+    """
+    Time a query, then run it again under tracemalloc (which slows down the allocations) for its peak memory.
+    The heuristic cache is cleared before each run, so that every planner pays for its heuristic.
+    """
+    kwargs = {'table': table if engine in ('table', 'flat') else None, 'flat_state': engine == 'flat',
+              'hierarchy': hierarchy}
+    heuristic_field.cache_clear()
+    result = plan(occupancy, start, goal, algorithm, **kwargs)
+    heuristic_field.cache_clear()
+    tracemalloc.start()
+    plan(occupancy, start, goal, algorithm, **kwargs)
+    result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result
+
+
+def benchmark(maps, algorithms=ALGORITHMS, engines=('dict',), queries=5, seed=0, verbose=True):
+    """
+    :param maps: iterable of (name, occupancy) pairs
+    :return: list of result rows (dicts with the keys of FIELDS)
+    """
+    rows = []
+    for name, occupancy in maps:
+        table = NeighbourTable(occupancy) if set(engines) & {'table', 'flat'} else None
+        # the abstract graph of HPA* is built once per map, like the neighbour table (and not timed)
+        hierarchy = HierarchicalMap(occupancy) if 'HPA_star' in algorithms else None
+        if hierarchy is not None:
+            hierarchy.refresh()
+        for i, (start, goal) in enumerate(random_queries(occupancy, queries, seed)):
+            # A* on the 8-connected grid gives the optimal length the other planners are compared to
+            optimal = plan(occupancy, start, goal, 'A_star')['length']
+            for algorithm in algorithms:
+                for engine in engines:
+                    result = run_query(occupancy, start, goal, algorithm, engine, table, hierarchy)
+                    rows.append({'map': name,
+                                 'size': '{}x{}'.format(*occupancy.shape),
+                                 'query': i,
+                                 'start': start,
+                                 'goal': goal,
+                                 'algo': algorithm,
+                                 'engine': engine,
+                                 'time': result['time'],
+                                 'steps': result['steps'],
+                                 'peak_memory': result['peak_memory'],
+                                 'length': result['length'],
+                                 'optimal': optimal,
+                                 'suboptimality': result['length'] / optimal if 0 < optimal < np.inf else np.nan})
+                    if verbose:
+                        print('{:<22}{:>4} {:<17}{:<6}{:>10.4f}s{:>9} steps{:>10.2f}{:>8.3f}'.format(
+                            name, i, algorithm, engine, result['time'], result['steps'], result['length'],
+                            rows[-1]['suboptimality']))
+    return rows
+
+
+def run_scenario(path, algorithms=('A_star',), map_path=None, flat_state=False, workers=1, verbose=True):
+    """
+    Run all the queries of a MovingAI scenario with each algorithm, through engine.plan_many: the map is loaded,
+    and its neighbour table built, once per map. The reference length is the optimal length given by the scenario.
+    :param map_path: map file of the queries (default: the map named in the scenario, in the folder of the .scen file)
+    :param workers: number of processes running the queries (see parallel.plan_parallel)
+    :return: list of result rows (dicts with the keys of FIELDS, without peak_memory)
+    """
+    rows = []
+    scenario = load_movingai_scen(path)
+    for name in dict.fromkeys(query['map'] for query in scenario):
+        occupancy = load_movingai_map(map_path or os.path.join(os.path.dirname(path), name))
+        queries = [query for query in scenario if query['map'] == name]
+        for algorithm in algorithms:
+            tic = time.perf_counter()
+            pairs = [(query['start'], query['goal']) for query in queries]
+            if workers > 1:
+                results = plan_parallel(occupancy, pairs, algorithm, workers=workers, flat_state=flat_state)
+            else:
+                results = plan_many(occupancy, pairs, algorithm, flat_state=flat_state)
+            for i, (query, result) in enumerate(zip(queries, results)):
+                optimal = query['optimal']
+                rows.append({'map': name,
+                             'size': '{}x{}'.format(*occupancy.shape),
+                             'query': i,
+                             'start': query['start'],
+                             'goal': query['goal'],
+                             'algo': algorithm,
+                             'engine': 'flat' if flat_state else 'table',
+                             'time': result['time'],
+                             'steps': result['steps'],
+                             'peak_memory': np.nan,
+                             'length': result['length'],
+                             'optimal': optimal,
+                             'suboptimality': result['length'] / optimal if optimal > 0 else np.nan})
+            if verbose:
+                print('{:<22}{:<17}{:>6} queries {:>10.3f}s'.format(name, algorithm, len(queries),
+                                                                     time.perf_counter() - tic))
+    return rows
+
+
+def summary(rows):
+    """
+    Print the mean time, expansions and suboptimality of each algorithm and engine over all the queries.
+    """
+    print('\n{:<17}{:<7}{:>11}{:>11}{:>12}{:>8}'.format('algo', 'engine', 'time (ms)', 'steps', 'memory (kB)',
+                                                         'ratio'))
+    for key in dict.fromkeys((row['algo'], row['engine']) for row in rows):
+        selected = [row for row in rows if (row['algo'], row['engine']) == key]
+        print('{:<17}{:<7}{:>11.2f}{:>11.0f}{:>12.0f}{:>8.3f}'.format(
+            *key,
+            1000 * np.mean([row['time'] for row in selected]),
+            np.mean([row['steps'] for row in selected]),
+            np.mean([row['peak_memory'] for row in selected]) / 1024,
+            np.nanmean([row['suboptimality'] for row in selected])))
+
+
+def write_csv(rows, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_json(rows, path, **meta):
+    # inf and nan are not valid JSON: unreachable goals and undefined ratios are written as null
+    clean = [{key: None if isinstance(value, float) and not np.isfinite(value) else value
+              for key, value in row.items()} for row in rows]
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': clean}, f, indent=1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-maps", nargs='+', default=list(GENERATORS), choices=list(GENERATORS))
+    parser.add_argument("-sizes", nargs='+', type=int, default=[32, 64])
+    parser.add_argument("-movingai", nargs='*', default=[])
+    parser.add_argument("-algorithms", nargs='+', default=list(ALGORITHMS), choices=list(ALGORITHMS))
+    parser.add_argument("-engines", nargs='+', default=['dict'], choices=list(ENGINES))
+    parser.add_argument("-scen", default=None)
+    parser.add_argument("-map", default=None)
+    parser.add_argument("-workers", type=int, default=1)
+    parser.add_argument("-queries", type=int, default=5)
+    parser.add_argument("-seed", type=int, default=0)
+    parser.add_argument("-csv", default=None)
+    parser.add_argument("-json", default=None)
+    args = parser.parse_args()
+
+    if args.scen:
+        rows = run_scenario(args.scen, args.algorithms, args.map, 'flat' in args.engines, args.workers)
+    else:
+        maps = [('{}_{}'.format(kind, size), GENERATORS[kind](size, size, seed=args.seed))
+                for kind in args.maps for size in args.sizes]
+        maps += [(path, load_movingai_map(path)) for path in args.movingai]
+        rows = benchmark(maps, args.algorithms, args.engines, args.queries, args.seed)
+    summary(rows)
+    if args.csv:
+        write_csv(rows, args.csv)
+    if args.json:
+        write_json(rows, args.json, date=time.strftime('%Y-%m-%d %H:%M:%S'), seed=args.seed, sizes=args.sizes,
+                   queries=args.queries, engines=args.engines)
@@ -0,0 +1,379 @@
+"""
+Headless planning engine: runs the planners of algorithms.py to completion without pygame.
+The interactive world advances the same search generator (search) one step at a time to animate it.
+"""
+import time
+from collections import namedtuple
+from functools import partial
+
+import numpy as np
+
+from algorithms import A_star, Dijkstra, greed_best_first, Theta_star, jump_point_search, bidirectional_search, \
+    LPA_star, LPA_star_update, LPA_key, ARA_star, ARA_star_restart, ARA_bound
+from hpa import HierarchicalMap, HPA_star
+from utils import heuristic, post_smoothing, path_length, path_cost, OpenSet, SearchState, NeighbourTable, \
+    LazyField, SightCache, HEURISTIC_FIELD_MAX_CELLS
+
+BIDIRECTIONAL = ('bidir_Dijkstra', 'bidir_A_star')
+# one step of a search: the nodes closed and opened (or updated), and the number of nodes in the frontier;
+# the steps of an anytime search (ARA_star) that find an improved path also carry it, with its suboptimality bound
+StepEvent = namedtuple('StepEvent', ('closed', 'opened', 'frontier', 'path', 'bound'), defaults=(None, None))
+ALGORITHMS = ('Dijkstra', 'greed_best_first', 'A_star', 'A_star_PS', 'WA_star', 'ARA_star', 'Theta_star', 'JPS',
+              'LPA_star', 'HPA_star') + BIDIRECTIONAL
+WEIGHT = 2.  # default weight of the heuristic of WA_star
+ARA_SCHEDULE = (3., 2., 1.5, 1.25, 1.)  # weights of the successive ARA_star iterations (from the initial one)
+
+
+def get_occupancy(grid):
+    """
+    :param grid: world grid (cell value 2 is a wall) or boolean obstacle array
+    :return: boolean occupancy array, True for the wall cells
+    """
+    return grid if grid.dtype == bool else grid == 2
+
+
+def new_search(grid, start, h, flat_state=False):
+    """
+    :return: the state of a search from start, guided by the heuristic field h
+    """
+    if flat_state:
+        state = SearchState(grid.shape)
+        inner, g_score, f_score, come_from = state.inner, state.g_score, state.f_score, state.come_from
+        g_score[start] = 0
+        f_score[start] = h[start]
+    else:
+        inner, g_score, f_score, come_from = set(), {start: 0}, {start: h[start]}, {start: None}
+    return {'h': h,
+            'frontier': OpenSet(start, h[start]),
+            'inner': inner,
+            'g_score': g_score,
+            'f_score': f_score,
+            'come_from': come_from}
+
+
+def init_search(algorithm, grid, start, goal, metric='euclidean', table=None, flat_state=False, hierarchy=None,
+                sight=None, weight=None, terrain=None, min_cost=None):
+    """
+    :param table: optional NeighbourTable of the map, shared by all the searches on it
+    :param hierarchy: HierarchicalMap of the map, used (and built if missing) by HPA_star
+    :param terrain: optional array of the traversal cost of each cell (positive floats, see utils.edge_cost).
+                    The planners apply it to the moves they read (the table only holds the walls; a given hierarchy
+                    must have been built with the same terrain), the heuristics are scaled by the minimum cost.
+                    JPS, whose pruning only holds on uniform costs, runs as A_star on a terrain
+    :param min_cost: minimum cost of the terrain, if already known (computed from the whole terrain otherwise): the
+                     owner of a terrain keeps it up to date with the edits instead of computing it for each search
+    :param sight: optional SightCache of the map, used by Theta_star and A_star_PS
+    :param weight: weight of the heuristic of WA_star (default WEIGHT), initial one of ARA_star (default: the first
+                   of ARA_SCHEDULE; the next iterations use the smaller weights of the schedule)
+    :param flat_state: keep the search state in a SearchState (flat preallocated buffers) instead of dicts and sets
+    :return: data_algo, the state of the search: bind_step binds a planner to it, search advances it
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError('unknown algorithm: {}'.format(algorithm))
+    if terrain is None:
+        min_cost = 1
+    else:
+        min_cost = float(terrain.min()) if min_cost is None else min_cost
+        if min_cost <= 0:
+            raise ValueError('the terrain costs must be positive')
+
+    # HPA* searches the abstract graph of the map (its nodes are cells: the search is drawn like the others)
+    if algorithm == 'HPA_star':
+        if hierarchy is None:
+            hierarchy = HierarchicalMap(get_occupancy(grid), terrain=terrain)
+        return hierarchy.init_search(start, goal, min_cost)
+
+    # LPA* keeps G and rhs values (dicts only), and can be repaired with repair_search when the walls change
+    if algorithm == 'LPA_star':
+        h = heuristic(grid, goal, metric, min_cost)
+        return {'h': h,
+                'goal': goal,
+                'metric': metric,
+                'min_cost': min_cost,
+                'table': table,
+                'terrain': terrain,
+                'frontier': OpenSet(start, (h[start], 0)),
+                'inner': set(),
+                'g_score': {},
+                'rhs': {start: 0}}
+
+    if algorithm not in BIDIRECTIONAL:
+        data_algo = new_search(grid, start, heuristic(grid, goal, metric, min_cost), flat_state)
+        data_algo['table'] = table
+        data_algo['sight'] = sight
+        data_algo['terrain'] = terrain
+        data_algo['weight'] = 1
+        if algorithm == 'WA_star':
+            data_algo['weight'] = WEIGHT if weight is None else weight
+        elif algorithm == 'ARA_star':
+            data_algo['weight'] = ARA_SCHEDULE[0] if weight is None else max(weight, 1)
+            data_algo['schedule'] = [w for w in ARA_SCHEDULE if w < data_algo['weight']]
+            data_algo['incons'] = set()  # inner nodes improved during an iteration, expanded by the next one
+        return data_algo
+
+    # the bidirectional searches also run a search from the goal to the start (see algorithms.bidirectional_search)
+    if algorithm == 'bidir_Dijkstra':
+        h = h_backward = np.zeros(grid.shape) if grid.size <= HEURISTIC_FIELD_MAX_CELLS else LazyField(lambda cell: 0.)
+        offset = 0
+    else:
+        h_goal, h_start = heuristic(grid, goal, metric, min_cost), heuristic(grid, start, metric, min_cost)
+        offset = h_goal[start]
+        if isinstance(h_goal, LazyField):
+            h = LazyField(lambda cell: (h_goal[cell] - h_start[cell] + offset) / 2)
+            h_backward = LazyField(lambda cell: (h_start[cell] - h_goal[cell] + offset) / 2)
+        else:
+            h = (h_goal - h_start + offset) / 2
+            h_backward = (h_start - h_goal + offset) / 2
+    data_algo = new_search(grid, start, h, flat_state)
+    data_algo['table'] = table
+    data_algo['terrain'] = terrain
+    data_algo['backward'] = new_search(grid, goal, h_backward, flat_state)
+    data_algo['meeting'] = {'cost': np.inf, 'edge': None, 'offset': offset}
+    if start == goal:
+        data_algo['meeting'].update(cost=0, edge=(start, goal))
+    return data_algo
+
+
+def bind_step(data_algo, algorithm, occupancy, start, goal):
+    """
+    Bind the planner of the selected algorithm to the state of a search, once for the whole search.
+    :return: function without arguments that expands one node: it returns the planner result, whose first item is None
+             once the goal has been reached (and then the last one is the path)
+    """
+    if algorithm in ('A_star', 'A_star_PS', 'WA_star') or algorithm == 'JPS' and data_algo['terrain'] is not None:
+        return partial(A_star, occupancy, goal,
+                       data_algo['h'],
+                       data_algo['frontier'],
+                       data_algo['inner'],
+                       data_algo['g_score'],
+                       data_algo['f_score'],
+                       data_algo['come_from'],
+                       data_algo['table'],
+                       data_algo['weight'],
+                       data_algo['terrain'])
+    elif algorithm == 'ARA_star':
+        return partial(ARA_star, occupancy, goal,
+                       data_algo['h'],
+                       data_algo['frontier'],
+                       data_algo['inner'],
+                       data_algo['g_score'],
+                       data_algo['f_score'],
+                       data_algo['come_from'],
+                       data_algo['incons'],
+                       data_algo['weight'],
+                       data_algo['table'],
+                       data_algo['terrain'])
+    elif algorithm == 'Dijkstra':
+        return partial(Dijkstra, occupancy, goal,
+                       data_algo['frontier'],
+                       data_algo['inner'],
+                       data_algo['g_score'],
+                       data_algo['come_from'],
+                       data_algo['table'],
+                       data_algo['terrain'])
+    elif algorithm == 'greed_best_first':
+        return partial(greed_best_first, occupancy, goal,
+                       data_algo['h'],
+                       data_algo['frontier'],
+                       data_algo['inner'],
+                       data_algo['come_from'],
+                       data_algo['table'])
+    elif algorithm == 'Theta_star':
+        return partial(Theta_star, occupancy, start, goal,
+                       data_algo['h'],
+                       data_algo['frontier'],
+                       data_algo['inner'],
+                       data_algo['g_score'],
+                       data_algo['f_score'],
+                       data_algo['come_from'],
+                       data_algo['table'],
+                       data_algo['sight'],
+                       data_algo['terrain'])
+    elif algorithm == 'JPS':
+        return partial(jump_point_search, occupancy, goal,
+                       data_algo['h'],
+                       data_algo['frontier'],
+                       data_algo['inner'],
+                       data_algo['g_score'],
+                       data_algo['f_score'],
+                       data_algo['come_from'])
+    elif algorithm == 'LPA_star':
+        return partial(LPA_star, occupancy, start, goal,
+                       data_algo['h'],
+                       data_algo['frontier'],
+                       data_algo['inner'],
+                       data_algo['g_score'],
+                       data_algo['rhs'],
+                       data_algo['table'],
+                       data_algo['terrain'])
+    elif algorithm == 'HPA_star':
+        return partial(HPA_star, data_algo['hierarchy'], goal,
+                       data_algo['frontier'],
+                       data_algo['inner'],
+                       data_algo['g_score'],
+                       data_algo['f_score'],
+                       data_algo['come_from'],
+                       data_algo['links'])
+    elif algorithm in BIDIRECTIONAL:
+        return partial(bidirectional_search, occupancy, data_algo, data_algo['backward'], data_algo['meeting'],
+                       data_algo['table'], data_algo['terrain'])
+    raise ValueError('unknown algorithm: {}'.format(algorithm))
+
+
+def finish_path(path, algorithm, occupancy, data_algo):
+    # post-processing of the path found by the planner
+    if algorithm == 'A_star_PS':
+        path = post_smoothing(path, occupancy, data_algo['sight'], data_algo['terrain'])
+    return path
+
+
+def search(algorithm, grid, start, goal, metric='euclidean', table=None, flat_state=False, hierarchy=None, sight=None,
+           data_algo=None, weight=None, budget=None, time_limit=None, terrain=None, min_cost=None):
+    """
+    Generator of a search: the planner is bound to its state once (see bind_step), then each next() expands one node.
+    The anytime ARA_star yields each improved path it finds (StepEvent.path and bound), then goes on with the next
+    weight of its schedule: its last path (weight 1) is the shortest one.
+    :param data_algo: state of the search (default: a new one, from init_search with the same parameters)
+    :param budget: maximum number of steps
+    :param time_limit: deadline of the search, in seconds from its first step
+    :return: yields a StepEvent after each step that has not ended the search; returns (StopIteration.value)
+             the path, or None if the goal cannot be reached. When the budget or the time limit runs out, the search
+             returns the best path found so far (by ARA_star; None for the other planners)
+    """
+    start, goal = tuple(start), tuple(goal)
+    occupancy = get_occupancy(grid)
+    if data_algo is None:
+        data_algo = init_search(algorithm, grid, start, goal, metric, table, flat_state, hierarchy, sight, weight,
+                                terrain, min_cost)
+    step = bind_step(data_algo, algorithm, occupancy, start, goal)
+    if algorithm == 'LPA_star' and len(data_algo['frontier']) == 0:
+        # a repaired LPA_star search with no inconsistent node left: its last path (if any) is still the shortest one
+        result = step()
+        return result[-1] if result[0] is None else None
+    frontiers = [data_algo['frontier']] + ([data_algo['backward']['frontier']] if 'backward' in data_algo else [])
+    best, best_cost = None, np.inf
+    steps = 0
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    while len(data_algo['frontier']) > 0:
+        if budget is not None and steps >= budget or deadline is not None and time.perf_counter() >= deadline:
+            return best
+        result = step()
+        steps += 1
+        path = bound = None
+        # the planners return None in place of the frontier once the goal has been reached
+        restart = result[0] is None
+        if restart:
+            path = finish_path(result[-1], algorithm, occupancy, data_algo)
+            if algorithm != 'ARA_star' or not data_algo['schedule']:
+                return path
+            # an iteration may end on the path of the previous one: only the improved paths are yielded
+            if data_algo['g_score'][goal] < best_cost:
+                best, best_cost = path, data_algo['g_score'][goal]
+                bound = ARA_bound(goal, data_algo['h'], data_algo['frontier'], data_algo['g_score'],
+                                  data_algo['incons'], data_algo['weight'])
+            else:
+                path = None
+        deltas = [frontier.take_delta() for frontier in frontiers]
+        yield StepEvent([closed for closed, _ in deltas if closed is not None],
+                        [node for _, opened in deltas for node in opened],
+                        sum(len(frontier) for frontier in frontiers),
+                        path, bound)
+        if restart:
+            # next iteration of ARA_star, with the next weight of the schedule
+            data_algo['weight'] = data_algo['schedule'].pop(0)
+            ARA_star_restart(data_algo['h'], data_algo['frontier'], data_algo['inner'], data_algo['g_score'],
+                             data_algo['f_score'], data_algo['incons'], data_algo['weight'])
+            step = bind_step(data_algo, algorithm, occupancy, start, goal)
+    return best
+
+
+def repair_search(data_algo, occupancy, start, cells):
+    """
+    Bring the state of a finished LPA_star search up to date after the wall state (or the terrain cost) of some cells
+    has changed.
+    The next search on it then expands only the nodes whose distance from the start has changed.
+    """
+    terrain = data_algo['terrain']
+    lowest = min(float(terrain[cell]) for cell in cells) if terrain is not None and cells else None
+    if lowest is not None and lowest < data_algo['min_cost']:
+        # a cell cheaper than the minimum the heuristic was scaled by: it would overestimate, so it is rescaled and
+        # the frontier re-keyed (the G and rhs values do not depend on it)
+        data_algo['min_cost'] = lowest
+        data_algo['h'] = heuristic(occupancy, data_algo['goal'], data_algo['metric'], lowest)
+        for node in list(data_algo['frontier']):
+            data_algo['frontier'].push(node, LPA_key(node, data_algo['h'], data_algo['g_score'], data_algo['rhs']))
+    LPA_star_update(occupancy, start,
+                    data_algo['h'],
+                    data_algo['frontier'],
+                    data_algo['g_score'],
+                    data_algo['rhs'],
+                    cells,
+                    data_algo['table'],
+                    data_algo['terrain'])
+    data_algo['inner'] = set()
+    return data_algo
+
+
+def plan(grid, start, goal, algorithm='A_star', metric='euclidean', table=None, flat_state=False, hierarchy=None,
+         sight=None, weight=None, budget=None, time_limit=None, terrain=None, min_cost=None):
+    """
+    Run a planner to completion in a tight loop (no rendering, no frame limiter).
+    :param grid: world grid (cell value 2 is a wall) or boolean obstacle array
+    :param start: start cell (row, col)
+    :param goal: goal cell (row, col)
+    :param algorithm: one of ALGORITHMS
+    :param metric: heuristic metric, one of utils.METRICS
+    :param table: optional NeighbourTable of the map: build it once and reuse it for all the queries on a map
+    :param flat_state: store the search state in flat buffers (a few bytes per cell, for very large grids)
+    :param hierarchy: HierarchicalMap of the map for HPA_star: build it once and reuse it for all the queries on a map
+    :param sight: SightCache of the map for Theta_star and A_star_PS, shared by the queries on a map
+    :param weight: weight of the heuristic of WA_star and ARA_star (see init_search)
+    :param budget: maximum number of steps (see search)
+    :param time_limit: deadline in seconds (see search): ARA_star returns its best path found in time
+    :param terrain: optional cost of each cell (see init_search)
+    :param min_cost: minimum cost of the terrain, if already known (see init_search)
+    :return: dict with the path (None if the goal is unreachable), the number of steps (expansions),
+             the path length, its cost (the length without a terrain) and the elapsed time in seconds
+    """
+    tic = time.perf_counter()
+    events = search(algorithm, grid, start, goal, metric, table, flat_state, hierarchy, sight, weight=weight,
+                    budget=budget, time_limit=time_limit, terrain=terrain, min_cost=min_cost)
+    steps = 0
+    found = None  # last path yielded by an anytime search
+    while True:
+        try:
+            event = next(events)
+        except StopIteration as stop:
+            path = stop.value
+            break
+        steps += 1
+        found = event.path if event.path is not None else found
+    # the expansion that reaches the goal is a step too (unless the search has been stopped with the path found before)
+    steps += path is not None and path is not found
+    elapsed = time.perf_counter() - tic
+
+    return {'algo': algorithm,
+            'path': path,
+            'steps': steps,
+            'length': path_length(path) if path is not None else np.inf,
+            'cost': path_cost(path, get_occupancy(grid), terrain) if path is not None else np.inf,
+            'time': elapsed}
+
+
+def plan_many(grid, queries, algorithm='A_star', metric='euclidean', flat_state=False, terrain=None):
+    """
+    Run a batch of queries on the same map. The map data is computed once and shared by all the queries:
+    the occupancy array, the NeighbourTable (or the HierarchicalMap of HPA_star), the line of sight checks of
+    Theta_star and A_star_PS (SightCache), and the heuristic field of each goal (cached by utils.heuristic_field).
+    :param queries: iterable of (start, goal) pairs
+    :param terrain: optional cost of each cell (see init_search)
+    :return: list with the result of plan for each query, in order
+    """
+    occupancy = get_occupancy(grid)
+    table = NeighbourTable(occupancy)
+    hierarchy = HierarchicalMap(occupancy, terrain=terrain) if algorithm == 'HPA_star' else None
+    sight = SightCache()
+    min_cost = None if terrain is None else float(terrain.min())
+    return [plan(occupancy, start, goal, algorithm, metric, table, flat_state, hierarchy, sight, terrain=terrain,
+                 min_cost=min_cost)
+            for start, goal in queries]
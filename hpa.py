@@ -0,0 +1,254 @@
+"""
+Hierarchical path-finding (HPA*, Botea et al. 2004).
+The map is split into square clusters. The cells on both sides of the free segments of each cluster border
+(entrances), and of the diagonal moves across a border or a corner that no straight move next to them replaces, become
+the nodes of a small abstract graph, linked by the moves across the borders and by the shortest distances inside each
+cluster. A query connects the start and the goal to the nodes of their clusters, searches the
+abstract graph, then refines each abstract edge with A* on the window of its cluster.
+The abstract graph is built once per map: an edited wall only invalidates the clusters around it, which are rebuilt
+at the next query.
+"""
+from heapq import heappush, heappop
+
+import numpy as np
+
+from algorithms import A_star
+from utils import reconstruct_path, dist, get_edges, edge_cost, heuristic_field, OpenSet
+
+MIN_WIDE_ENTRANCE = 6  # entrances at least this wide get a node at each end, the others one in the middle
+
+
+class HierarchicalMap:
+
+    def __init__(self, occupancy, cluster=10, terrain=None):
+        """
+        :param occupancy: boolean array, True for the wall cells (shared with the owner: update() reads the edits)
+        :param cluster: side of the clusters (in cells)
+        :param terrain: optional cost of each cell (see utils.edge_cost), shared with the owner as well
+        """
+        self.occupancy = occupancy
+        self.terrain = terrain
+        self.min_cost = 1.  # minimum terrain cost, scale of the heuristic (set by init_search)
+        self.cluster = cluster
+        self.height, self.width = occupancy.shape
+        self.rows = -(-self.height // cluster)  # number of clusters along each axis
+        self.cols = -(-self.width // cluster)
+        self.transitions = {}  # border (cluster, next cluster) -> list of (cell, cell across the border)
+        self.nodes = {}  # cluster -> set of its abstract nodes (cells)
+        self.edges = {}  # node -> {node: cost} of the abstract graph
+        self.dirty = {(i, j) for i in range(self.rows) for j in range(self.cols)}  # clusters to (re)build
+
+    def cluster_of(self, cell):
+        return cell[0] // self.cluster, cell[1] // self.cluster
+
+    def window(self, cluster):
+        # (top, left, bottom, right) cell bounds of a cluster
+        top, left = cluster[0] * self.cluster, cluster[1] * self.cluster
+        return top, left, min(top + self.cluster, self.height), min(left + self.cluster, self.width)
+
+    def borders(self, cluster):
+        # borders (pairs of adjacent clusters, in row-major order) around a cluster: its sides, then its corners
+        i, j = cluster
+        around = [((i - 1, j), cluster), ((i, j - 1), cluster), (cluster, (i + 1, j)), (cluster, (i, j + 1)),
+                  ((i - 1, j - 1), cluster), ((i - 1, j + 1), cluster), (cluster, (i + 1, j - 1)),
+                  (cluster, (i + 1, j + 1))]
+        return [(a, b) for a, b in around
+                if 0 <= a[0] < self.rows and 0 <= a[1] < self.cols and 0 <= b[0] < self.rows and 0 <= b[1] < self.cols]
+
+    def update(self, cell):
+        """
+        Invalidate the clusters whose abstract graph may change after the wall state (or the terrain cost) of cell
+        has changed:
+        its own cluster, and the clusters across the borders it lies on.
+        """
+        x, y = cell
+        for dx, dy in ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)):
+            if 0 <= x + dx < self.height and 0 <= y + dy < self.width:
+                self.dirty.add(self.cluster_of((x + dx, y + dy)))
+
+    def find_transitions(self, border):
+        """
+        :return: the (cell, cell across the border) pairs of the entrances of a border
+        """
+        a, b = border
+        top, left, bottom, right = self.window(a)
+        if a[0] != b[0] and a[1] != b[1]:
+            return self.corner_transitions(a, b)
+        if b[0] > a[0]:  # horizontal border: rows bottom - 1 and bottom
+            span = np.arange(left, right)
+            sides = (np.full_like(span, bottom - 1), span), (np.full_like(span, bottom), span)
+        else:  # vertical border: columns right - 1 and right
+            span = np.arange(top, bottom)
+            sides = (span, np.full_like(span, right - 1)), (span, np.full_like(span, right))
+        open_a, open_b = ~self.occupancy[sides[0]], ~self.occupancy[sides[1]]
+        free = open_a & open_b
+
+        # runs of consecutive free pairs: [begin, end) along the border
+        edges = np.diff(np.concatenate(([0], free.astype(np.int8), [0])))
+        transitions = []
+        for begin, end in zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()):
+            picks = (begin, end - 1) if end - begin >= MIN_WIDE_ENTRANCE else ((begin + end - 1) // 2,)
+            for k in picks:
+                transitions.append(((int(sides[0][0][k]), int(sides[0][1][k])),
+                                    (int(sides[1][0][k]), int(sides[1][1][k]))))
+
+        # diagonal moves across the border (k to k + 1, and k + 1 to k): without a free straight pair next to them,
+        # they are the only link between their two cells
+        forward = open_a[:-1] & open_b[1:] & ~open_b[:-1] & ~open_a[1:]
+        backward = open_a[1:] & open_b[:-1] & ~open_a[:-1] & ~open_b[1:]
+        pairs = [(k, k + 1) for k in np.flatnonzero(forward).tolist()] + \
+            [(k + 1, k) for k in np.flatnonzero(backward).tolist()]
+        for i, j in pairs:
+            transitions.append(((int(sides[0][0][i]), int(sides[0][1][i])),
+                                (int(sides[1][0][j]), int(sides[1][1][j]))))
+        return transitions
+
+    def corner_transitions(self, a, b):
+        """
+        :return: the diagonal move across the corner shared by the clusters a and b (b below a, on its left or right),
+                 if the two other cells around the corner are walls (otherwise two straight moves replace it)
+        """
+        top, left, bottom, right = self.window(a)
+        column = right if b[1] > a[1] else left - 1  # column of b next to the corner
+        cell_a, cell_b = (bottom - 1, column + a[1] - b[1]), (bottom, column)
+        others = (bottom - 1, column), (bottom, column + a[1] - b[1])
+        if self.occupancy[cell_a] or self.occupancy[cell_b] or not all(self.occupancy[cell] for cell in others):
+            return []
+        return [(cell_a, cell_b)]
+
+    def distances(self, cluster, source, targets=None):
+        """
+        Dijkstra from source inside the window of a cluster.
+        :return: dict {cell: distance} of the targets reached (all the reachable cells if targets is None)
+        """
+        top, left, bottom, right = self.window(cluster)
+        g_score = {source: 0}
+        heap = [(0, source)]
+        inner = set()
+        found = {}
+        remaining = None if targets is None else len(targets)
+        while heap and remaining != 0:
+            g, curr = heappop(heap)
+            if curr in inner:
+                continue
+            inner.add(curr)
+            if targets is None or curr in targets:
+                found[curr] = g
+                remaining = None if remaining is None else remaining - 1
+            for neighbour, cost in get_edges(curr, self.occupancy, terrain=self.terrain):
+                if top <= neighbour[0] < bottom and left <= neighbour[1] < right and \
+                        g + cost < g_score.get(neighbour, np.inf):
+                    g_score[neighbour] = g + cost
+                    heappush(heap, (g + cost, neighbour))
+        return found
+
+    def refresh(self):
+        """
+        Rebuild the abstract graph of the dirty clusters (and of the clusters sharing a border with them).
+        """
+        if not self.dirty:
+            return
+        borders = {border for cluster in self.dirty for border in self.borders(cluster)}
+        for border in borders:
+            self.transitions[border] = self.find_transitions(border)
+        affected = self.dirty | {cluster for border in borders for cluster in border}
+
+        for cluster in affected:
+            for node in self.nodes.get(cluster, ()):
+                self.edges.pop(node, None)
+            nodes = set()
+            for a, b in self.borders(cluster):
+                for cell_a, cell_b in self.transitions[(a, b)]:
+                    nodes.add(cell_a if a == cluster else cell_b)
+            self.nodes[cluster] = nodes
+            for node in nodes:
+                self.edges[node] = {other: cost for other, cost in self.distances(cluster, node, nodes).items()
+                                    if other != node}
+
+        # moves across the borders of the affected clusters
+        for cluster in affected:
+            for border in self.borders(cluster):
+                for cell_a, cell_b in self.transitions[border]:
+                    cost = edge_cost(cell_a, cell_b, dist(cell_a, cell_b), self.terrain)
+                    self.edges[cell_a][cell_b] = cost
+                    self.edges[cell_b][cell_a] = cost
+        self.dirty = set()
+
+    def init_search(self, start, goal, min_cost=1):
+        """
+        :param min_cost: minimum terrain cost, scale of the heuristic of the query (and of its refinement)
+        :return: data_algo of a query: the abstract search state, with the temporary links of the start and the goal
+                 to the nodes of their clusters
+        """
+        self.refresh()
+        self.min_cost = min_cost
+        links = {}  # node -> {node: cost} of the temporary edges
+        start_cluster, goal_cluster = self.cluster_of(start), self.cluster_of(goal)
+        targets = self.nodes[start_cluster] | ({goal} if goal_cluster == start_cluster else set())
+        links[start] = {node: cost for node, cost in self.distances(start_cluster, start, targets).items()
+                        if node != start}
+        # the distances inside a cluster are symmetric: the goal is reached from the nodes of its cluster
+        for node, cost in self.distances(goal_cluster, goal, self.nodes[goal_cluster]).items():
+            if node != goal:
+                links.setdefault(node, {})[goal] = cost
+        return {'hierarchy': self,
+                'frontier': OpenSet(start, self.min_cost * dist(start, goal)),
+                'inner': set(),
+                'g_score': {start: 0},
+                'f_score': {start: self.min_cost * dist(start, goal)},
+                'come_from': {start: None},
+                'links': links}
+
+    def refine(self, path):
+        """
+        :return: the grid path of an abstract path: A* inside the cluster of each abstract edge
+                 (the moves across the borders are already grid moves)
+        """
+        cells = path[:1]
+        for a, b in zip(path[:-1], path[1:]):
+            if self.cluster_of(a) != self.cluster_of(b):
+                cells.append(b)
+                continue
+            top, left, bottom, right = self.window(self.cluster_of(a))
+            local = self.occupancy[top:bottom, left:right]
+            local_start, local_goal = (a[0] - top, a[1] - left), (b[0] - top, b[1] - left)
+            h = heuristic_field(local.shape, local_goal, scale=self.min_cost)
+            terrain = None if self.terrain is None else self.terrain[top:bottom, left:right]
+            frontier = OpenSet(local_start, h[local_start])
+            inner, g_score, f_score, come_from = set(), {local_start: 0}, {local_start: h[local_start]}, \
+                {local_start: None}
+            local_path = None
+            while local_path is None:
+                result = A_star(local, local_goal, h, frontier, inner, g_score, f_score, come_from, terrain=terrain)
+                if result[0] is None:
+                    local_path = result[-1]
+            cells.extend((x + top, y + left) for x, y in local_path[1:])
+        return cells
+
+
+def HPA_star(hierarchy, goal, frontier, inner, g_score, f_score, come_from, links):
+    # choose as current the abstract node with the lower F score, where F(n) = G(n) + H(n)
+    curr = frontier.pop()
+
+    # check if it is the goal: refine the abstract path into a grid path
+    if curr == goal:
+        path = hierarchy.refine(reconstruct_path(curr, come_from))
+        return None, None, None, path
+
+    inner.add(curr)
+
+    # abstract edges of the node, and the temporary edges of the query (start and goal links)
+    neighborhood = list(hierarchy.edges.get(curr, {}).items()) + list(links.get(curr, {}).items())
+
+    for neighbour, cost in neighborhood:
+        if neighbour in inner:
+            continue
+
+        new_gScore = g_score[curr] + cost
+        if new_gScore < g_score.get(neighbour, np.inf):
+            come_from[neighbour] = curr
+            g_score[neighbour] = new_gScore
+            f_score[neighbour] = new_gScore + hierarchy.min_cost * dist(neighbour, goal)
+            frontier.push(neighbour, f_score[neighbour])
+
+    return frontier, inner, g_score, come_from
@@ -0,0 +1,206 @@
+"""
+Reproducible map generators, MovingAI map loader and terrain (cost map) loader.
+A map is a boolean occupancy array (True for the wall cells), as used by engine.plan and the planners.
+"""
+import numpy as np
+from PIL import Image
+
+MOVINGAI_PASSABLE = b'.GS'  # ground, ground, swamp; '@', 'O', 'T' and 'W' are obstacles
+TERRAIN_MAX_COST = 10.  # cost of the black pixels of a terrain image (the white ones cost 1)
+
+
+def random_map(height, width, density=0.25, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.random((height, width)) < density
+
+
+def maze_map(height, width, seed=0):
+    """
+    Perfect maze (one path between any two cells) with corridors of width 1, carved by a randomized depth-first search
+    on the cells with odd coordinates.
+    """
+    rng = np.random.default_rng(seed)
+    occupancy = np.ones((height, width), dtype=bool)
+    rows, cols = (height - 1) // 2, (width - 1) // 2
+    visited = np.zeros((rows, cols), dtype=bool)
+    stack = [(0, 0)]
+    visited[0, 0] = True
+    occupancy[1, 1] = False
+    while stack:
+        x, y = stack[-1]
+        moves = [(dx, dy) for dx, dy in ((0, 1), (1, 0), (0, -1), (-1, 0))
+                 if 0 <= x + dx < rows and 0 <= y + dy < cols and not visited[x + dx, y + dy]]
+        if not moves:
+            stack.pop()
+            continue
+        dx, dy = moves[rng.integers(len(moves))]
+        visited[x + dx, y + dy] = True
+        # open the cell and the wall between the two cells
+        occupancy[2 * (x + dx) + 1, 2 * (y + dy) + 1] = False
+        occupancy[2 * x + 1 + dx, 2 * y + 1 + dy] = False
+        stack.append((x + dx, y + dy))
+    return occupancy
+
+
+def rooms_map(height, width, room=10, door=2, seed=0):
+    """
+    Square rooms of side room - 1, each wall between two rooms with a door of width door at a random position.
+    """
+    rng = np.random.default_rng(seed)
+    occupancy = np.zeros((height, width), dtype=bool)
+    occupancy[::room, :] = True
+    occupancy[:, ::room] = True
+    for x in range(room, height - 1, room):
+        for y in range(0, width, room):
+            span = min(room, width - y) - door
+            if span > 1:
+                offset = y + 1 + rng.integers(span - 1)
+                occupancy[x, offset:offset + door] = False
+    for y in range(room, width - 1, room):
+        for x in range(0, height, room):
+            span = min(room, height - x) - door
+            if span > 1:
+                offset = x + 1 + rng.integers(span - 1)
+                occupancy[offset:offset + door, y] = False
+    return occupancy
+
+
+def corridors_map(height, width, spacing=4, seed=0):
+    """
+    Long parallel corridors: a wall every spacing columns, with a single opening at a random position.
+    """
+    rng = np.random.default_rng(seed)
+    occupancy = np.zeros((height, width), dtype=bool)
+    for y in range(spacing, width - 1, spacing):
+        occupancy[:, y] = True
+        opening = rng.integers(height - spacing + 1)
+        occupancy[opening:opening + spacing - 1, y] = False
+    return occupancy
+
+
+GENERATORS = {'random': random_map,
+              'maze': maze_map,
+              'rooms': rooms_map,
+              'corridors': corridors_map}
+
+
+def load_movingai_map(path):
+    """
+    Parse a MovingAI benchmark map (.map): a header (type, height, width) followed by "map" and one line per row.
+    The rows are decoded in a single array operation, without per-cell Python objects.
+    :return: boolean occupancy array
+    """
+    with open(path, 'rb') as f:
+        height, width = read_movingai_header(f)
+        rows = f.read().split()
+    if len(rows) < height or any(len(row) != width for row in rows[:height]):
+        raise ValueError('{}: expected {} rows of {} cells'.format(path, height, width))
+    cells = np.frombuffer(b''.join(rows[:height]), dtype=np.uint8).reshape(height, width)
+    return ~np.isin(cells, np.frombuffer(MOVINGAI_PASSABLE, dtype=np.uint8))
+
+
+def random_queries(occupancy, count, seed=0):
+    """
+    :return: list of "count" (start, goal) pairs of distinct free cells
+    """
+    rng = np.random.default_rng(seed)
+    free = np.argwhere(~occupancy)
+    queries = []
+    while len(queries) < count and len(free) > 1:
+        start, goal = rng.choice(len(free), 2, replace=False)
+        queries.append((tuple(free[start].tolist()), tuple(free[goal].tolist())))
+    return queries
+
+
+def read_movingai_header(f):
+    """
+    Read the header of an open .map file, up to the "map" line.
+    :return: (height, width) of the map
+    """
+    header = {}
+    for line in f:
+        fields = line.split()
+        if fields and fields[0] == b'map':
+            break
+        if len(fields) == 2:
+            header[fields[0].decode()] = fields[1].decode()
+    return int(header['height']), int(header['width'])
+
+
+def convert_movingai_map(path, npy_path, chunk=1024):
+    """
+    Convert a MovingAI map into a .npy world grid (see world_grid) that can be memory-mapped (np.load(mmap_mode=...)).
+    The rows are read and written "chunk" at a time, so the map is never held in memory as a whole.
+    """
+    passable = np.frombuffer(MOVINGAI_PASSABLE, dtype=np.uint8)
+    with open(path, 'rb') as f:
+        height, width = read_movingai_header(f)
+        grid = np.lib.format.open_memmap(npy_path, mode='w+', dtype=np.int8, shape=(height, width))
+        for begin in range(0, height, chunk):
+            rows = [f.readline().rstrip(b'\r\n') for _ in range(min(chunk, height - begin))]
+            if any(len(row) != width for row in rows):
+                raise ValueError('{}: expected {} rows of {} cells'.format(path, height, width))
+            cells = np.frombuffer(b''.join(rows), dtype=np.uint8).reshape(len(rows), width)
+            grid[begin:begin + len(rows)] = world_grid(~np.isin(cells, passable))
+        grid.flush()
+    del grid
+
+
+def copy_rows(source, target, function=None, chunk=1024):
+    """
+    Copy source into target (e.g. two memory-mapped arrays) "chunk" rows at a time, through function if given.
+    """
+    for begin in range(0, source.shape[0], chunk):
+        rows = source[begin:begin + chunk]
+        target[begin:begin + chunk] = rows if function is None else function(rows)
+    return target
+
+
+def load_movingai_scen(path):
+    """
+    Parse a MovingAI scenario file (.scen): "version 1" followed by one query per line,
+    bucket, map, map width, map height, start x, start y, goal x, goal y, optimal length.
+    x is the column and y the row: the cells are returned as (row, col), like the rest of the project.
+    :return: list of dicts with the keys bucket, map, start, goal and optimal
+    """
+    queries = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split('\t') if '\t' in line else line.split()
+            if len(fields) < 9:
+                continue  # version line or blank line
+            bucket, name, _, _, start_x, start_y, goal_x, goal_y, optimal = fields[:9]
+            queries.append({'bucket': int(bucket),
+                            'map': name,
+                            'start': (int(start_y), int(start_x)),
+                            'goal': (int(goal_y), int(goal_x)),
+                            'optimal': float(optimal)})
+    return queries
+
+
+def load_terrain(path, shape=None):
+    """
+    Load a terrain, the traversal cost of each cell (see utils.edge_cost): from an array file (.npy, the costs
+    themselves, memory-mapped) or from an image (its gray levels: white costs 1, black TERRAIN_MAX_COST).
+    :param shape: (height, width) of the map: an image is resized to it, an array must have it
+    :return: array of positive costs
+    """
+    if path.endswith('.npy'):
+        terrain = np.load(path, mmap_mode='r')
+        if shape is not None and terrain.shape != tuple(shape):
+            raise ValueError('{}: expected a terrain of shape {}, got {}'.format(path, tuple(shape), terrain.shape))
+    else:
+        image = Image.open(path).convert('L')
+        if shape is not None:
+            image = image.resize((shape[1], shape[0]), Image.NEAREST)
+        terrain = 1 + (255 - np.asarray(image, dtype=np.float32)) / 255 * (TERRAIN_MAX_COST - 1)
+    if terrain.min() <= 0:
+        raise ValueError('{}: the terrain costs must be positive'.format(path))
+    return terrain
+
+
+def world_grid(occupancy):
+    """
+    :return: clean grid of the world (cell value 2 for the walls, 0 elsewhere) of a boolean occupancy array
+    """
+    return occupancy.astype(np.int8) * 2
@@ -0,0 +1,94 @@
+"""
+Parallel execution of many independent queries on the same static map.
+The map data that does not depend on the goal (occupancy array, NeighbourTable and terrain) is copied once into shared
+memory: the worker processes attach to it when they start, and only the (start, goal) pairs and the results are pickled.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from engine import get_occupancy, plan
+from hpa import HierarchicalMap
+from utils import NeighbourTable, SightCache
+
+_worker = {}  # state of a worker process, set by _init_worker
+
+
+def share_array(array):
+    """
+    Copy an array into a new shared memory block.
+    :return: the block (to be closed and unlinked by the owner) and the (name, shape, dtype) spec of the array
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def attach_array(spec):
+    """
+    :return: the block and the array described by spec (see share_array), read-only
+    """
+    name, shape, dtype = spec
+    # the pool workers share the resource tracker of the parent process, which unlinks the block
+    block = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    array.flags.writeable = False
+    return block, array
+
+
+def _init_worker(specs, algorithm, metric, flat_state, min_cost):
+    blocks, arrays = zip(*[attach_array(spec) for spec in specs])
+    occupancy, indices = arrays[:2]
+    terrain = arrays[2] if len(arrays) > 2 else None
+    _worker.update(blocks=blocks,  # keep the blocks open as long as the worker lives
+                   occupancy=occupancy,
+                   table=NeighbourTable.from_arrays(occupancy, indices),
+                   # one hierarchy per worker
+                   hierarchy=HierarchicalMap(occupancy, terrain=terrain) if algorithm == 'HPA_star' else None,
+                   sight=SightCache(),
+                   terrain=terrain,
+                   min_cost=min_cost,
+                   algorithm=algorithm,
+                   metric=metric,
+                   flat_state=flat_state)
+
+
+def _run_query(query):
+    start, goal = query
+    return plan(_worker['occupancy'], start, goal, _worker['algorithm'], _worker['metric'], _worker['table'],
+                _worker['flat_state'], _worker['hierarchy'], _worker['sight'], terrain=_worker['terrain'],
+                min_cost=_worker['min_cost'])
+
+
+def plan_parallel(grid, queries, algorithm='A_star', metric='euclidean', workers=None, chunksize=None,
+                  flat_state=False, terrain=None):
+    """
+    Run a batch of queries on the same map with a pool of worker processes (same results as engine.plan_many).
+    :param queries: iterable of (start, goal) pairs
+    :param workers: number of processes (default: one per core)
+    :param chunksize: number of queries sent to a worker at once (default: about 4 chunks per worker)
+    :param terrain: optional array of the traversal cost of each cell, shared with the workers like the walls
+    :return: list with the result of engine.plan for each query, in the order of the queries
+    """
+    queries = list(queries)
+    workers = workers or os.cpu_count()
+    occupancy = get_occupancy(grid)
+    table = NeighbourTable(occupancy)
+    arrays = (occupancy, table.indices) if terrain is None else (occupancy, table.indices, terrain)
+    min_cost = None if terrain is None else float(terrain.min())
+    blocks, specs = [], []
+    try:
+        for array in arrays:
+            block, spec = share_array(array)
+            blocks.append(block)
+            specs.append(spec)
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(specs, algorithm, metric, flat_state, min_cost)) as pool:
+            return list(pool.map(_run_query, queries,
+                                 chunksize=chunksize or max(1, len(queries) // (4 * workers))))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
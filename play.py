@@ -1,5 +1,9 @@
 from world import world
+from maps import load_movingai_map, convert_movingai_map, load_terrain
+from profiling import Profiler
 import argparse
+import os
+import numpy as np
 
 parser = argparse.ArgumentParser()
 parser.add_argument("-H", type=int, default=20)
@@ -8,8 +12,35 @@ parser.add_argument("-P", type=int, default=800)
 parser.add_argument("-M", type=int, default=1)
 parser.add_argument("-sbs", action='store_true', default=False)
 parser.add_argument("-gif", action='store_true', default=False)
+parser.add_argument("-vec", action='store_true', default=False)
+parser.add_argument("-gif_every", type=int, default=1)
+parser.add_argument("-map", default=None)
+parser.add_argument("-memmap", default=None)
+parser.add_argument("-terrain", default=None)
+parser.add_argument("-profile", action='store_true', default=False)
+parser.add_argument("-profile_json", default=None)
 
 args = parser.parse_args()
-height, width, margin, pixels, sbs, gif = args.H, args.W, args.M, args.P, args.sbs, args.gif
-game = world(height=height, width=width, margin=margin, pixels=pixels, step_by_step=sbs, gif=gif)
+height, width, margin, pixels, sbs, gif, vec = args.H, args.W, args.M, args.P, args.sbs, args.gif, args.vec
+occupancy = None
+if args.map is not None:
+    occupancy = load_movingai_map(args.map)  # the grid takes the size of the map, -H and -W the size of the viewport
+memmap = args.memmap
+if memmap is not None and memmap.endswith('.map'):
+    # a MovingAI map is converted once to a .npy grid next to it, which is then memory-mapped
+    if not os.path.exists(memmap[:-4] + '.npy'):
+        convert_movingai_map(memmap, memmap[:-4] + '.npy')
+    memmap = memmap[:-4] + '.npy'
+terrain = None
+if args.terrain is not None:
+    # the terrain takes the size of the map (an image is resized to it)
+    if memmap is not None:
+        shape = np.load(memmap, mmap_mode='r').shape
+    else:
+        shape = (height, width) if occupancy is None else occupancy.shape
+    terrain = load_terrain(args.terrain, shape)
+game = world(height=height, width=width, margin=margin, pixels=pixels, step_by_step=sbs, gif=gif, vectorized=vec,
+             gif_every=args.gif_every, map_occupancy=occupancy, memmap=memmap, map_terrain=terrain)
+if args.profile or args.profile_json is not None:
+    Profiler(args.profile_json).instrument(game)
 game.run()
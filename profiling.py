@@ -0,0 +1,147 @@
+"""
+Opt-in instrumentation of the runs: cumulative time and number of calls of each phase (node selection, neighbours,
+line of sight, planner steps, coloring, drawing), planner steps per second and peak frontier size.
+Nothing is measured unless instrument() is called: it replaces the functions of each phase with timed wrappers,
+so the normal runs pay no cost.
+
+    profiler = Profiler('profile.json')
+    profiler.instrument(game)  # game: world instance (or None for the headless engine)
+    game.run()
+"""
+import json
+import sys
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+import algorithms
+import engine
+import hpa
+import utils
+from utils import OpenSet
+
+# the planner steps include the selection, the neighbours and the line of sight checks
+PHASES = ('search_step', 'select', 'neighbours', 'line_of_sight', 'coloring', 'draw')
+
+
+class Profiler:
+
+    def __init__(self, json_path=None, verbose=True):
+        """
+        :param json_path: file where the profiles of all the runs are written (rewritten after each run)
+        :param verbose: print the profile of each run after its line of the results table
+        """
+        self.json_path = json_path
+        self.verbose = verbose
+        self.runs = []  # profiles of the finished runs
+        self.current = None  # profile of the run being recorded
+        self.patched = []  # (owner, attribute name, original value)
+
+    def timed(self, phase, function):
+        def wrapper(*args, **kwargs):
+            if self.current is None:
+                return function(*args, **kwargs)
+            tic = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record = self.current['phases'][phase]
+                record[0] += perf_counter() - tic
+                record[1] += 1
+        return wrapper
+
+    def patch(self, owner, name, wrapper):
+        self.patched.append((owner, name, owner.__dict__.get(name)))
+        setattr(owner, name, wrapper)
+
+    def instrument(self, game=None):
+        """
+        Wrap the phases of the planners (and of the world "game", if given: its runs are recorded one by one).
+        """
+        self.patch(OpenSet, 'pop', self.timed('select', OpenSet.pop))
+        for module in (algorithms, hpa):
+            self.patch(module, 'get_edges', self.timed('neighbours', module.get_edges))
+        for module in (algorithms, utils):
+            self.patch(module, 'line_of_sight', self.timed('line_of_sight', module.line_of_sight))
+        # the planner steps are the calls of the step functions bound by engine.bind_step (see engine.search)
+        bind_step = engine.bind_step
+        self.patch(engine, 'bind_step', lambda *args: self.timed('search_step', bind_step(*args)))
+        self.patch(engine, 'search', self.observed(engine.search))
+        if game is None:
+            return
+
+        world_module = sys.modules[type(game).__module__]
+        self.patch(world_module, 'search', self.observed(world_module.search))
+        self.patch(game, 'color_cells', self.timed('coloring', game.color_cells))
+        self.patch(game, 'draw', self.timed('draw', game.draw))
+        self.patch(game, 'draw_array', self.timed('draw', game.draw_array))
+
+        self.patch(game, 'algorithm', self.recorded(game.algorithm))
+        self.patch(game, 'compare', self.recorded(game.compare, 'compare'))
+
+    def recorded(self, function, label=None):
+        # a run of the world, labelled with the algorithm name (its first argument) if label is None
+        def wrapper(*args, **kwargs):
+            with self.run(label or args[0]):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def uninstrument(self):
+        for owner, name, original in reversed(self.patched):
+            if original is None:
+                delattr(owner, name)  # instance attribute over a method
+            else:
+                setattr(owner, name, original)
+        self.patched = []
+
+    def observed(self, search):
+        # search generator whose events (see engine.StepEvent) update the peak size of the frontier
+        def wrapper(*args, **kwargs):
+            events = search(*args, **kwargs)
+            while True:
+                try:
+                    event = next(events)
+                except StopIteration as stop:
+                    return stop.value  # the path
+                if self.current is not None:
+                    self.current['peak_frontier'] = max(self.current['peak_frontier'], event.frontier)
+                yield event
+        return wrapper
+
+    @contextmanager
+    def run(self, label):
+        """
+        Record a run: the phases timed until the end of the with block.
+        """
+        self.current = {'algo': label, 'phases': defaultdict(lambda: [0., 0]), 'peak_frontier': 0}
+        tic = perf_counter()
+        try:
+            yield self.current
+        finally:
+            current, self.current = self.current, None
+            current['time'] = perf_counter() - tic
+            self.finish(current)
+
+    def finish(self, current):
+        phases = current.pop('phases')
+        steps, planner_time = phases['search_step'][1], phases['search_step'][0]
+        if steps == 0:
+            return  # nothing has been searched (no start or goal)
+        current.update(steps=steps,
+                       steps_per_second=steps / planner_time if planner_time > 0 else None,
+                       phases={phase: {'time': phases[phase][0], 'calls': phases[phase][1]}
+                               for phase in PHASES if phase in phases})
+        self.runs.append(current)
+        if self.verbose:
+            print(self.report(current))
+        if self.json_path is not None:
+            with open(self.json_path, 'w') as f:
+                json.dump(self.runs, f, indent=1)
+
+    @staticmethod
+    def report(run):
+        lines = ['        {}: {} steps in {:.3f} s ({:.0f} steps/s in the planner), peak frontier {}'.format(
+            run['algo'], run['steps'], run['time'], run['steps_per_second'] or 0, run['peak_frontier'])]
+        for phase, record in run['phases'].items():
+            lines.append('        {:>14s} {:9.4f} s {:8d} calls'.format(phase, record['time'], record['calls']))
+        return '\n'.join(lines)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the modules of the repository are imported from its root, the pygame windows are not shown
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
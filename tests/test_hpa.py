@@ -0,0 +1,63 @@
+import numpy as np
+import pygame
+import pytest
+
+from engine import plan
+from hpa import HierarchicalMap
+from utils import path_length
+from world import world
+
+
+def diagonal_gap():
+    # rows 9 and 10 are walls, except two cells linked only by a diagonal move across the border of the clusters
+    occupancy = np.zeros([20, 20], dtype=bool)
+    occupancy[9:11] = True
+    occupancy[9, 5] = occupancy[10, 6] = False
+    return occupancy
+
+
+def corner_gap(anti_diagonal):
+    # two opposite quarters of the map, linked only by a diagonal move across the corner of their clusters
+    occupancy = np.ones([20, 20], dtype=bool)
+    if anti_diagonal:
+        occupancy[:10, 10:] = occupancy[10:, :10] = False
+        return occupancy, (0, 19), (19, 0)
+    occupancy[:10, :10] = occupancy[10:, 10:] = False
+    return occupancy, (0, 0), (19, 19)
+
+
+def test_diagonal_entrance():
+    occupancy = diagonal_gap()
+    expected = plan(occupancy, (0, 0), (19, 19), 'Dijkstra')['length']
+    assert expected == pytest.approx(29.2132)
+    assert plan(occupancy, (0, 0), (19, 19), 'HPA_star')['length'] == expected
+    hierarchy = HierarchicalMap(np.zeros([20, 20], dtype=bool))
+    hierarchy.refresh()
+    # the same map drawn on a hierarchy built before the walls
+    hierarchy.occupancy[:] = occupancy
+    for cell in zip(*np.nonzero(occupancy)):
+        hierarchy.update(cell)
+    assert plan(occupancy, (0, 0), (19, 19), 'HPA_star', hierarchy=hierarchy)['length'] == expected
+
+
+@pytest.mark.parametrize('anti_diagonal', [False, True])
+def test_corner_entrance(anti_diagonal):
+    occupancy, start, goal = corner_gap(anti_diagonal)
+    result = plan(occupancy, start, goal, 'HPA_star')
+    assert result['path'] is not None
+    assert result['length'] == plan(occupancy, start, goal, 'A_star')['length']
+
+
+def test_diagonal_entrance_in_the_world():
+    game = world(height=20, width=20, pixels=200, update_speed=0, map_occupancy=diagonal_gap())
+    pygame.init()
+    game.screen = pygame.display.set_mode(game.WINDOW_SIZE)
+    try:
+        for cell_type, cell in (('source', (0, 0)), ('goal', (19, 19))):
+            game.update_grid(cell_type, cell, clean_grid=True)
+            game.update_grid(cell_type, cell, clean_grid=False)
+        game.algorithm('HPA_star', game.color['LIGHTBLUE'])
+        assert len(game.paths) == 1
+        assert path_length(game.paths[0][0]) == pytest.approx(29.2132)
+    finally:
+        pygame.quit()
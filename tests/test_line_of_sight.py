@@ -0,0 +1,20 @@
+import numpy as np
+
+from utils import line_of_sight, line_of_sight_batch
+
+
+def test_batch_matches_line_of_sight():
+    rng = np.random.default_rng(0)
+    occupancy = rng.random([20, 25]) < 0.25
+    a = rng.integers(0, [20, 25], size=[500, 2])
+    b = rng.integers(0, [20, 25], size=[500, 2])
+    # segments through cell corners (diagonals and 2:1 slopes) and of a single cell as well
+    b[:50] = np.clip(a[:50] + rng.integers(-6, 7, size=[50, 1]) * [1, 1], 0, 19)
+    b[50:100] = np.clip(a[50:100] + rng.integers(-4, 5, size=[50, 1]) * [2, 1], 0, 19)
+    b[100:110] = a[100:110]
+    expected = [line_of_sight(tuple(p), tuple(q), occupancy) for p, q in zip(a, b)]
+    assert line_of_sight_batch(a, b, occupancy).tolist() == expected
+
+
+def test_batch_of_no_segment():
+    assert line_of_sight_batch(np.empty([0, 2]), np.empty([0, 2]), np.zeros([3, 3], dtype=bool)).shape == (0,)
@@ -0,0 +1,60 @@
+import numpy as np
+
+from engine import init_search, search, repair_search, plan
+from utils import path_cost
+
+
+def corridor():
+    # 3x4 map whose only free cells are (1, 1) and (1, 2)
+    occupancy = np.ones([3, 4], dtype=bool)
+    occupancy[1, 1:3] = False
+    return occupancy
+
+
+def run(events):
+    while True:
+        try:
+            next(events)
+        except StopIteration as stop:
+            return stop.value
+
+
+def test_last_expansion_empties_the_frontier():
+    result = plan(corridor(), (1, 1), (1, 2), 'LPA_star')
+    assert result['path'] == [(1, 1), (1, 2)]
+    assert result['length'] == 1
+
+
+def test_repair_without_inconsistent_nodes():
+    occupancy = corridor()
+    data_algo = init_search('LPA_star', occupancy, (1, 1), (1, 2))
+    assert run(search('LPA_star', occupancy, (1, 1), (1, 2), data_algo=data_algo)) == [(1, 1), (1, 2)]
+    # a wall cell far from the path is "edited" without changing: nothing is left to expand
+    data_algo = repair_search(data_algo, occupancy, (1, 1), [(0, 3)])
+    assert run(search('LPA_star', occupancy, (1, 1), (1, 2), data_algo=data_algo)) == [(1, 1), (1, 2)]
+
+
+def test_repair_after_a_wall_edit():
+    occupancy = np.zeros([10, 10], dtype=bool)
+    occupancy[2:9, 5] = True
+    data_algo = init_search('LPA_star', occupancy, (5, 0), (5, 9))
+    run(search('LPA_star', occupancy, (5, 0), (5, 9), data_algo=data_algo))
+    occupancy[0:2, 5] = True
+    data_algo = repair_search(data_algo, occupancy, (5, 0), [(0, 5), (1, 5)])
+    path = run(search('LPA_star', occupancy, (5, 0), (5, 9), data_algo=data_algo))
+    assert path is not None and path[-1] == (5, 9)
+    assert plan(occupancy, (5, 0), (5, 9), 'LPA_star')['length'] == plan(occupancy, (5, 0), (5, 9), 'A_star')['length']
+
+
+def test_repair_after_lowering_the_terrain():
+    # the heuristic was scaled by the minimum cost 3: cells of cost 1 make it overestimate unless it is rescaled
+    occupancy = np.zeros([15, 15], dtype=bool)
+    terrain = np.full([15, 15], 3.)
+    data_algo = init_search('LPA_star', occupancy, (0, 0), (14, 14), terrain=terrain)
+    run(search('LPA_star', occupancy, (0, 0), (14, 14), data_algo=data_algo))
+    cells = [(x, y) for x in range(15) for y in range(15) if (3 * x + 5 * y) % 7 == 0]
+    terrain[tuple(np.transpose(cells))] = 1.
+    data_algo = repair_search(data_algo, occupancy, (0, 0), cells)
+    path = run(search('LPA_star', occupancy, (0, 0), (14, 14), data_algo=data_algo))
+    expected = plan(occupancy, (0, 0), (14, 14), 'Dijkstra', terrain=terrain)['cost']
+    assert abs(path_cost(path, occupancy, terrain) - expected) < 1e-9
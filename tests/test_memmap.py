@@ -0,0 +1,33 @@
+import tracemalloc
+
+import numpy as np
+import pygame
+
+from utils import HEURISTIC_FIELD_MAX_CELLS
+from world import world
+
+
+def test_memmap_run_allocates_nothing_map_sized(tmp_path):
+    # a map larger than HEURISTIC_FIELD_MAX_CELLS: the heuristic is computed lazily as well
+    side = int(np.sqrt(HEURISTIC_FIELD_MAX_CELLS)) + 1
+    occupancy = np.zeros([side, side], dtype=bool)
+    occupancy[10, 5:15] = True
+    np.save(tmp_path / 'map.npy', occupancy)
+    del occupancy
+
+    game = world(height=40, width=60, pixels=400, update_speed=0, memmap=str(tmp_path / 'map.npy'), vectorized=True)
+    pygame.init()
+    game.screen = pygame.display.set_mode(game.WINDOW_SIZE)
+    for cell_type, cell in (('source', (5, 10)), ('goal', (20, 10))):
+        game.update_grid(cell_type, cell, clean_grid=True)
+        game.update_grid(cell_type, cell, clean_grid=False)
+
+    tracemalloc.start()
+    try:
+        game.algorithm('A_star', game.color['RED'])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        pygame.quit()
+    assert len(game.paths) == 1
+    assert peak < side * side // 8  # the walls alone take side * side bytes
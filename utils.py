@@ -1,15 +1,197 @@
 import numpy as np
-from PIL import Image
-import os
-import sys
+from PIL import Image, GifImagePlugin
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from heapq import heappush, heappop
+from itertools import count
+
+
+class OpenSet:
+    """
+    Frontier of a search: a binary heap with lazy deletion.
+    Pushing a node that is already in the frontier updates its priority (decrease-key); the stale heap entry
+    is skipped when it reaches the top. Equal priorities are popped in insertion order.
+    Iteration, membership and len() work as for the plain set used before, so the frontier can still be drawn.
+    The last popped node and the nodes pushed after it are recorded, so that a step can be drawn incrementally.
+    """
+
+    REMOVED = object()  # placeholder for a node whose heap entry is stale
+
+    def __init__(self, start=None, priority=0):
+        self.heap = []  # entries [priority, insertion number, node]
+        self.entries = {}  # node -> its live heap entry
+        self.counter = count()
+        self.closed = None  # last popped node
+        self.opened = []  # nodes pushed (opened or updated) since the last pop
+        if start is not None:
+            self.push(start, priority)
+
+    def push(self, node, priority):
+        entry = self.entries.get(node)
+        if entry is not None:
+            entry[-1] = OpenSet.REMOVED
+        entry = [priority, next(self.counter), node]
+        self.entries[node] = entry
+        heappush(self.heap, entry)
+        self.opened.append(node)
+
+    def pop(self):
+        while self.heap:
+            priority, _, node = heappop(self.heap)
+            if node is not OpenSet.REMOVED:
+                del self.entries[node]
+                self.closed = node
+                self.opened = []
+                return node
+        raise KeyError('pop from an empty frontier')
+
+    def take_delta(self):
+        """
+        :return: the node popped by the last step and the nodes it pushed; both are cleared for the next call
+        """
+        closed, opened = self.closed, self.opened
+        self.closed, self.opened = None, []
+        return closed, opened
+
+    def min_priority(self):
+        """
+        :return: the priority of the node that would be popped next (inf for an empty frontier)
+        """
+        while self.heap and self.heap[0][-1] is OpenSet.REMOVED:
+            heappop(self.heap)
+        return self.heap[0][0] if self.heap else np.inf
+
+    def discard(self, node):
+        entry = self.entries.pop(node, None)
+        if entry is not None:
+            entry[-1] = OpenSet.REMOVED
+
+    def __contains__(self, node):
+        return node in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class CellValues:
+    """
+    Dict-like view of a flat per-cell buffer, keyed by (row, col).
+    A cell whose value is still the "missing" one counts as not in the view.
+    """
+
+    def __init__(self, buffer, width, missing):
+        self.buffer = buffer
+        self.width = width
+        self.missing = missing
+
+    def __getitem__(self, cell):
+        return self.buffer[cell[0] * self.width + cell[1]]
+
+    def __setitem__(self, cell, value):
+        self.buffer[cell[0] * self.width + cell[1]] = value
+
+    def __contains__(self, cell):
+        return self.buffer[cell[0] * self.width + cell[1]] != self.missing
+
+
+class CellParents(CellValues):
+    """
+    Dict-like view of a flat parent buffer: stores the id of the parent cell, -1 (None) for the roots.
+    """
+
+    def __init__(self, buffer, width):
+        super().__init__(buffer, width, -1)
+
+    def __getitem__(self, cell):
+        parent = self.buffer[cell[0] * self.width + cell[1]]
+        return divmod(parent, self.width) if parent != -1 else None
+
+    def __setitem__(self, cell, parent):
+        self.buffer[cell[0] * self.width + cell[1]] = parent[0] * self.width + parent[1] if parent is not None else -1
+
+
+class CellSet:
+    """
+    Set-like view of a flat buffer of flags, keyed by (row, col).
+    """
+
+    def __init__(self, flags, width):
+        self.flags = flags
+        self.width = width
+        self.size = 0
+
+    def add(self, cell):
+        i = cell[0] * self.width + cell[1]
+        if not self.flags[i]:
+            self.flags[i] = 1
+            self.size += 1
+
+    def discard(self, cell):
+        i = cell[0] * self.width + cell[1]
+        if self.flags[i]:
+            self.flags[i] = 0
+            self.size -= 1
+
+    def clear(self):
+        self.flags[:] = bytes(len(self.flags))
+        self.size = 0
+
+    def __contains__(self, cell):
+        return self.flags[cell[0] * self.width + cell[1]] == 1
+
+    def __iter__(self):
+        return (divmod(i, self.width) for i in np.flatnonzero(np.frombuffer(self.flags, dtype=np.uint8)).tolist())
+
+    def __len__(self):
+        return self.size
+
+
+class SearchState:
+    """
+    Search state stored in preallocated flat buffers indexed by the cell id (row * width + col):
+    G and F scores (8 bytes each), parent id (4 bytes) and closed flag (1 byte) per cell.
+    g_score, f_score, come_from and inner are views with the same interface as the dicts and set they replace,
+    so the planners accept either; the buffers themselves are exposed for vectorized post-processing.
+    """
+
+    def __init__(self, shape):
+        size = shape[0] * shape[1]
+        width = shape[1]
+        self.g = array('d', [np.inf]) * size
+        self.f = array('d', [np.inf]) * size
+        self.parent = array('i', [-1]) * size
+        self.closed = bytearray(size)
+        self.g_score = CellValues(self.g, width, np.inf)
+        self.f_score = CellValues(self.f, width, np.inf)
+        self.come_from = CellParents(self.parent, width)
+        self.inner = CellSet(self.closed, width)
 
 
 def reconstruct_path(curr, come_from):
+    """
+    Walk the parents back from curr. come_from is a dict or the parent view of a SearchState.
+    """
     path = []
     while curr is not None:
-        path.insert(0, curr)
+        path.append(curr)
         curr = come_from[curr]
-    return path
+    return path[::-1]
+
+
+def interpolate_path(path):
+    """
+    Fill in the cells between consecutive nodes of a path made of straight and diagonal segments (e.g. jump points).
+    """
+    cells = path[:1]
+    for a, b in zip(path[:-1], path[1:]):
+        steps = max(abs(b[0] - a[0]), abs(b[1] - a[1]))
+        dx, dy = (b[0] - a[0]) // steps, (b[1] - a[1]) // steps
+        cells.extend((a[0] + k * dx, a[1] + k * dy) for k in range(1, steps + 1))
+    return cells
 
 
 def dist(a, b):
@@ -23,46 +205,302 @@ def path_length(path):
     return np.round(length, 4)
 
 
-def heuristic(grid, goal, metric='euclidean'):
-    h = np.zeros(grid.shape)
-    for x in range(len(grid)):
-        for y in range(len(grid[0])):
-            if metric is 'euclidean':
-                h[x][y] = np.sqrt((x - goal[0]) ** 2 + (y - goal[1]) ** 2)
-            if metric is 'manhattan':
-                h[x][y] = dist((x, y), goal)
+def path_cost(path, occupancy, terrain=None):
+    """
+    :return: cost of a path on a terrain (see segment_cost), its length without a terrain
+    """
+    if terrain is None:
+        return path_length(path)
+    return np.round(sum(segment_cost(a, b, occupancy, terrain) for a, b in zip(path[:-1], path[1:])), 4)
+
+
+METRICS = ('euclidean', 'manhattan', 'octile', 'chebyshev')
+
+
+def metric_distance(dx, dy, metric='euclidean'):
+    """
+    :param dx, dy: absolute offsets along the rows and the columns (numbers or arrays)
+    """
+    if metric == 'euclidean':
+        return np.hypot(dx, dy)
+    elif metric == 'manhattan':
+        return dx + dy
+    elif metric == 'octile':
+        return np.maximum(dx, dy) + (np.sqrt(2) - 1) * np.minimum(dx, dy)
+    elif metric == 'chebyshev':
+        return np.maximum(dx, dy)
+    raise ValueError('unknown metric: {} (expected one of {})'.format(metric, ', '.join(METRICS)))
+
+
+@lru_cache(maxsize=8)
+def heuristic_field(shape, goal, metric='euclidean', scale=1):
+    """
+    Distance from every cell of a grid of the given shape to the goal, computed with array operations
+    (times scale, see heuristic).
+    Results are cached by (shape, goal, metric, scale) and returned read-only, since they are shared between runs.
+    """
+    dx = np.abs(np.arange(shape[0]) - goal[0])[:, np.newaxis]
+    dy = np.abs(np.arange(shape[1]) - goal[1])[np.newaxis, :]
+    h = metric_distance(dx, dy, metric).astype(float)
+    if scale != 1:
+        h *= scale
+    h.flags.writeable = False
     return h
 
 
-def get_neighborhood(cell, grid, wall):
-    moves = [[0, -1], [0, 1], [-1, 0], [1, 0], [-1, -1], [1, -1], [-1, 1], [1, 1]]
-    coordinates = [tuple(cell + m) for m in np.array(moves)]
-    infeasible = [elem for elem in coordinates if \
-                  (elem[0] < 0) or (elem[1] < 0) or \
-                  (elem[0] >= grid.shape[0]) or (elem[1] >= grid.shape[1]) \
-                  or (elem in wall)]
-    return [tuple(elem) for elem in coordinates if elem not in infeasible]
-
-
-def line_of_sight(a, b, wall, accuracy=100):
-    try:
-        xs = np.rint(np.linspace(a[0], b[0], accuracy))
-        ys = np.rint(np.linspace(a[1], b[1], accuracy))
-        for x, y in zip(xs, ys):
-            if (x, y) in wall:
-                return False
-        return True
-    except:
+class LazyField:
+    """
+    Per-cell values computed when they are read, h[cell] = function(cell): stands in for a heuristic field on maps
+    too large to hold one value per cell. Only the cells reached by the search are ever computed.
+    """
+
+    def __init__(self, function):
+        self.function = function
+
+    def __getitem__(self, cell):
+        return self.function(cell)
+
+
+HEURISTIC_FIELD_MAX_CELLS = 1 << 24  # larger grids get a LazyField (a full field would take more than 128 MB)
+
+
+def heuristic(grid, goal, metric='euclidean', scale=1):
+    """
+    :param scale: factor of the distances: the minimum terrain cost keeps the heuristic admissible on a cost map
+    """
+    goal = (int(goal[0]), int(goal[1]))
+    if grid.size > HEURISTIC_FIELD_MAX_CELLS:
+        metric_distance(0, 0, metric)  # fail now on an unknown metric, not at the first read
+        return LazyField(lambda cell: scale * float(metric_distance(abs(cell[0] - goal[0]), abs(cell[1] - goal[1]),
+                                                                    metric)))
+    return heuristic_field(grid.shape, goal, metric, scale)
+
+
+MOVES = ((0, -1), (0, 1), (-1, 0), (1, 0), (-1, -1), (1, -1), (-1, 1), (1, 1))
+MOVE_COSTS = tuple(float(np.hypot(dx, dy)) for dx, dy in MOVES)
+
+
+def edge_cost(a, b, length, terrain=None):
+    """
+    Cost of a move of the given length between the cells a and b: the length weighted by the mean terrain cost of
+    the two cells (the length itself without a terrain).
+    :param terrain: optional array of the traversal cost of each cell (positive floats)
+    """
+    if terrain is None:
+        return length
+    return length * (float(terrain[a]) + float(terrain[b])) * 0.5
+
+
+TABLE_CHUNK = 1 << 14  # cells whose rows are computed at once when a NeighbourTable is built
+
+
+class NeighbourTable:
+    """
+    Precomputed adjacency of a static map, in a (cells, len(MOVES)) int32 array indexed by the cell id
+    (row * width + col): slot k of the row of a cell holds the id of the cell reached by MOVES[k], or -1 if the move
+    leaves the map or ends on a wall. The cost of a move only depends on its slot (MOVE_COSTS), so only the ids are
+    stored (4 bytes per move). The fixed row width lets update() rewrite only the rows touched by a wall edit,
+    instead of rebuilding the whole table.
+    The table only depends on the walls: get_edges applies the terrain.
+    """
+
+    def __init__(self, occupancy):
+        self.occupancy = occupancy  # shared with the owner: update() reads the edited cells from it
+        self.height, self.width = occupancy.shape
+        size = occupancy.size
+        self.indices = np.empty([size, len(MOVES)], dtype=np.int32)
+        # by blocks of cells, to bound the size of the temporary arrays
+        for begin in range(0, size, TABLE_CHUNK):
+            self.fill_rows(np.arange(begin, min(begin + TABLE_CHUNK, size)))
+
+    @classmethod
+    def from_arrays(cls, occupancy, indices):
+        """
+        Wrap the array of an existing table (e.g. in shared memory) without computing the rows again.
+        """
+        table = cls.__new__(cls)
+        table.occupancy = occupancy
+        table.height, table.width = occupancy.shape
+        table.indices = indices
+        return table
+
+    def fill_rows(self, rows):
+        x, y = np.divmod(rows, self.width)
+        moves = np.array(MOVES)
+        nx = x[:, np.newaxis] + moves[:, 0]
+        ny = y[:, np.newaxis] + moves[:, 1]
+        valid = (nx >= 0) & (nx < self.height) & (ny >= 0) & (ny < self.width)
+        valid[valid] = ~self.occupancy[nx[valid], ny[valid]]
+        self.indices[rows] = np.where(valid, nx * self.width + ny, -1)
+
+    def update(self, cell):
+        """
+        Refresh the rows of a cell whose wall state has changed and of the cells around it.
+        """
+        x, y = cell
+        rows = [(x + dx) * self.width + y + dy for dx, dy in ((0, 0),) + MOVES
+                if 0 <= x + dx < self.height and 0 <= y + dy < self.width]
+        self.fill_rows(np.array(rows))
+
+    def edges(self, cell):
+        return [(divmod(j, self.width), cost)
+                for j, cost in zip(self.indices[cell[0] * self.width + cell[1]].tolist(), MOVE_COSTS) if j >= 0]
+
+
+def get_edges(cell, occupancy, table=None, terrain=None):
+    """
+    :param table: optional NeighbourTable of the map, read instead of testing the moves one by one
+    :param terrain: optional cost of each cell, applied to the moves when they are read (see edge_cost)
+    :return: list of (neighbour, cost of the move) pairs of the cell
+    """
+    if table is not None:
+        edges = table.edges(cell)
+    else:
+        height, width = occupancy.shape
+        x, y = cell
+        edges = [((x + dx, y + dy), cost) for (dx, dy), cost in zip(MOVES, MOVE_COSTS)
+                 if 0 <= x + dx < height and 0 <= y + dy < width and not occupancy[x + dx, y + dy]]
+    if terrain is not None:
+        return [(neighbour, edge_cost(cell, neighbour, cost, terrain)) for neighbour, cost in edges]
+    return edges
+
+
+def line_of_sight(a, b, occupancy):
+    """
+    :return: True if the segment between the centres of the cells a and b does not cross any wall cell
+    The cells crossed by the segment are visited exactly, with an integer grid traversal: at each move the next
+    boundary crossed along the segment decides between a horizontal, a vertical or (through a corner) a diagonal move.
+    """
+    x, y = a
+    dx, dy = abs(b[0] - x), abs(b[1] - y)
+    sx = 1 if b[0] > x else -1
+    sy = 1 if b[1] > y else -1
+    if occupancy[x, y]:
         return False
+    ix, iy = 0, 0  # boundaries crossed along each axis
+    while ix < dx or iy < dy:
+        # compare the segment parameters of the next crossings, (ix + 0.5) / dx and (iy + 0.5) / dy
+        decision = (1 + 2 * ix) * dy - (1 + 2 * iy) * dx
+        if decision <= 0:
+            x += sx
+            ix += 1
+        if decision >= 0:
+            y += sy
+            iy += 1
+        if occupancy[x, y]:
+            return False
+    return True
+
+
+def segment_cost(a, b, occupancy, terrain):
+    """
+    :return: cost of the segment between the centres of the cells a and b (any-angle move), inf if it crosses a wall:
+             its length weighted by the terrain costs of the cells it crosses. The cells are visited as in
+             line_of_sight, and each step between two of them costs as a move (see edge_cost)
+    """
+    x, y = a
+    dx, dy = abs(b[0] - x), abs(b[1] - y)
+    sx = 1 if b[0] > x else -1
+    sy = 1 if b[1] > y else -1
+    if occupancy[x, y]:
+        return np.inf
+    ix, iy = 0, 0  # boundaries crossed along each axis
+    cost, walk = 0., 0.  # cost and length of the steps between the crossed cells
+    while ix < dx or iy < dy:
+        decision = (1 + 2 * ix) * dy - (1 + 2 * iy) * dx
+        curr = x, y
+        if decision <= 0:
+            x += sx
+            ix += 1
+        if decision >= 0:
+            y += sy
+            iy += 1
+        if occupancy[x, y]:
+            return np.inf
+        length = MOVE_COSTS[-1] if decision == 0 else 1.
+        cost += edge_cost(curr, (x, y), length, terrain)
+        walk += length
+    return dist(a, b) * (cost / walk) if walk > 0 else 0.
+
+
+class SightCache:
+    """
+    Bounded LRU cache of line_of_sight results, shared by the any-angle planners (Theta_star, post_smoothing)
+    within a run and across the runs on the same map. The result does not depend on the direction of the segment,
+    so (a, b) and (b, a) share an entry. The owner of the map must clear() it when a wall changes.
+    """
 
+    def __init__(self, maxsize=1 << 16):
+        self.results = OrderedDict()  # (cell, cell) -> visibility, least recently used first
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
 
-def post_smoothing(come_from, wall):
+    def line_of_sight(self, a, b, occupancy):
+        key = (a, b) if a <= b else (b, a)
+        result = self.results.get(key)
+        if result is not None:
+            self.hits += 1
+            self.results.move_to_end(key)
+            return result
+        self.misses += 1
+        result = self.results[key] = line_of_sight(a, b, occupancy)
+        if len(self.results) > self.maxsize:
+            self.results.popitem(last=False)
+        return result
+
+    def clear(self):
+        self.results.clear()
+
+    def __len__(self):
+        return len(self.results)
+
+
+def line_of_sight_batch(a, b, occupancy):
+    """
+    Vectorized line_of_sight over many segments at once.
+    :param a: (N, 2) array of cells
+    :param b: (N, 2) array of cells
+    :param occupancy: boolean array, True for the wall cells
+    :return: (N,) boolean array, True where the segment a[i] - b[i] does not cross any wall cell
+    """
+    a = np.asarray(a, dtype=int).reshape(-1, 2)
+    b = np.asarray(b, dtype=int).reshape(-1, 2)
+    delta = b - a
+    steps = np.abs(delta)
+    # segment parameters of the crossings of the cell boundaries along each axis (padded with 1 = end of segment)
+    k = np.arange(max(steps.max(initial=0), 1))
+    crossings = [np.where(k < steps[:, [axis]], (k + 0.5) / np.maximum(steps[:, [axis]], 1), 1.) for axis in (0, 1)]
+    t = np.sort(np.hstack([np.zeros((len(a), 1))] + crossings + [np.ones((len(a), 1))]), axis=1)
+    # the midpoint of each non-empty interval between two crossings lies inside one of the crossed cells
+    valid = t[:, 1:] > t[:, :-1]
+    middle = (t[:, 1:] + t[:, :-1]) / 2
+    cells = np.rint(a[:, np.newaxis, :] + middle[..., np.newaxis] * delta[:, np.newaxis, :]).astype(int)
+    blocked = occupancy[cells[..., 0], cells[..., 1]] & valid
+    return ~blocked.any(axis=1)
+
+
+def post_smoothing(come_from, occupancy, sight=None, terrain=None):
+    # sight: optional SightCache of the map
+    # terrain: optional cost of each cell: a shortcut must also cost less than the part of the path it replaces
+    visible = line_of_sight if sight is None else sight.line_of_sight
+    if terrain is not None:
+        along = np.cumsum([0.] + [edge_cost(a, b, dist(a, b), terrain) for a, b in zip(come_from[:-1], come_from[1:])])
+        anchor = 0  # index in come_from of the last node of the smoothed path
     k = 0
     path = [come_from[0]]
     for i in range(len(come_from) - 1):
-        if not line_of_sight(path[k], come_from[i + 1], wall):
+        if terrain is None:
+            blocked = not visible(path[k], come_from[i + 1], occupancy)
+        else:
+            # (up to the rounding errors: a straight shortcut over uniform costs always costs its length)
+            blocked = segment_cost(path[k], come_from[i + 1], occupancy, terrain) > \
+                along[i + 1] - along[anchor] + 1e-9
+        if blocked:
             k += 1
             path.append(come_from[i])
+            if terrain is not None:
+                anchor = i
     k += 1
     path.append(come_from[-1])
     return path
@@ -84,31 +522,58 @@ def build_print_line(algorithm, steps, paths, run_num, printed_infos):
     # self.caption = self.print_this
 
 
-def create_gif(run_name, algorithm):
-    images = []
-    sorted_list_dir = numerically_sorted(os.listdir("./temp"))
-    for img in sorted_list_dir:
-        img_path = os.getcwd() + '/temp/' + str(img) + '.bmp'
-        images.append(Image.open(img_path))
-        # add last image more time in order to visualize the final result
-        if img == len(sorted_list_dir):
-            for _ in range(50):
-                images.append(Image.open(img_path))
-        os.remove(img_path)
-
-    images[0].save('./{}_{}.gif'.format(run_name, algorithm),
-                   save_all=True,
-                   append_images=images[1:],
-                   duration=60,
-                   loop=0)
-
-
-def numerically_sorted(directory):
-    l = []
-    for file_name in directory:
-        try:
-            l.append(int(file_name.split('.')[0]))
-        except ValueError:
-            print('The /temp directory must contains only file in the format int.bpm')
-            sys.exit(1)
-    return sorted(l)
+class GifWriter:
+    """
+    Write the frames of a run to a gif file while they are produced, instead of saving them to disk and
+    assembling the gif at the end. Only the frame being held back (the candidate last frame) stays in memory.
+    Frames are mapped to a fixed palette, so that every frame shares the global color table of the file.
+    """
+
+    def __init__(self, path, colors, every=1, duration=60, final_duration=3000):
+        """
+        :param path: output file
+        :param colors: list of the RGB colors that can appear in the frames
+        :param every: keep one frame every "every" (the last frame is always kept)
+        :param duration: duration of each frame in ms
+        :param final_duration: duration of the last frame in ms, to show the result
+        """
+        self.path = path
+        self.every = max(every, 1)
+        self.duration = duration
+        self.final_duration = final_duration
+        flat = [value for color in colors for value in color]
+        self.palette = Image.new('P', (1, 1))
+        self.palette.putpalette(flat + flat[:3] * (256 - len(colors)))
+        self.fp = None
+        self.frames = 0  # frames received
+        self.pending = None  # last kept frame, written as soon as the next one arrives
+
+    def add(self, frame, last=False):
+        """
+        :param frame: RGB PIL image
+        :param last: the frame is the final one: keep it regardless of the sampling, and close the file
+        """
+        self.frames += 1
+        if last or (self.frames - 1) % self.every == 0:
+            if self.pending is not None:
+                self.write(self.pending, self.duration)
+            self.pending = frame.quantize(palette=self.palette)
+        if last:
+            self.close()
+
+    def write(self, frame, duration):
+        if self.fp is None:
+            self.fp = open(self.path, 'wb')
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': 0})
+            self.fp.write(b''.join(header))
+        for data in GifImagePlugin.getdata(frame, duration=duration):
+            self.fp.write(data)
+
+    def close(self):
+        if self.pending is not None:
+            self.write(self.pending, self.final_duration)
+            self.pending = None
+        if self.fp is not None:
+            self.fp.write(b';')  # gif trailer
+            self.fp.close()
+            self.fp = None
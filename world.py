@@ -1,16 +1,23 @@
+import os
 import sys
+import tempfile
+import time
 from collections import defaultdict
 
 import numpy as np
 import pygame
+from PIL import Image
 
-from algorithms import A_star, Dijkstra, greed_best_first, Theta_star
-from utils import heuristic, post_smoothing, build_print_line, create_gif
+from engine import init_search, search, repair_search, get_occupancy
+from maps import world_grid, copy_rows
+from hpa import HierarchicalMap
+from utils import build_print_line, GifWriter, NeighbourTable, SightCache
 
 
 class world:
 
-    def __init__(self, height=20, width=20, margin=1, pixels=800, step_by_step=False, update_speed=45, gif=False):
+    def __init__(self, height=20, width=20, margin=1, pixels=800, step_by_step=False, update_speed=45, gif=False,
+                 vectorized=False, gif_every=1, map_occupancy=None, memmap=None, map_terrain=None):
 
         self.world_is_changed = True  # keep track of updates in start, goal or wall cells
         self.run_num = 0  # identify the run number
@@ -28,31 +35,70 @@ class world:
         self.caption = 'environment'
 
         # initialize the world
-        self.H, self.W, self.MARGIN, self.PIXELS = height, width, margin, pixels // height
-        self.WINDOW_SIZE = [self.PIXELS * self.W + self.MARGIN * self.W + self.MARGIN,
-                            self.PIXELS * self.H + self.MARGIN * self.H + self.MARGIN]
-        self.clean_grid = np.zeros([self.H, self.W], dtype=np.int8)
-        self.curr_grid = self.clean_grid.copy()
+        self.memmap = memmap  # .npy grid file of a map too large for the memory (see load_map)
+        self.scratch = None  # directory of the memory-mapped working copies of the memmap map
+        # with a map, height and width are the size of the viewport: the arrow keys move it over the map
+        if memmap is not None:
+            self.H, self.W = np.load(memmap, mmap_mode='r').shape
+        elif map_occupancy is not None:
+            self.H, self.W = map_occupancy.shape
+        else:
+            self.H, self.W = height, width
+        self.VH, self.VW = min(height, self.H), min(width, self.W)  # size of the viewport (in cells)
+        self.offset = [0, 0]  # map cell in the top-left corner of the viewport
+        self.MARGIN, self.PIXELS = margin, max(pixels // self.VH, 1)
+        self.WINDOW_SIZE = [self.PIXELS * self.VW + self.MARGIN * self.VW + self.MARGIN,
+                            self.PIXELS * self.VH + self.MARGIN * self.VH + self.MARGIN]
+        self.clean_grid = None  # start, goal and walls (set by load_map)
+        self.curr_grid = None  # clean_grid + the cells colored by the searches
         self.goal = None
         self.start = None
         self.paths = []  # list of paths (e.g. path[0] found by A*, path[1] found by GBF exc.)
-        self.wall = []  # list of wall cells
+        self.occupancy = None  # True for the wall cells
+        self.terrain = None  # traversal cost of each cell (set by load_map, or created by the first terrain brush)
+        self.min_cost = 1.  # minimum cost of the terrain (scale of the heuristics), None until it is recomputed
+        self.neighbours = None  # NeighbourTable of the map, built at the first run and kept in sync with the walls
+        self.sight = SightCache()  # line of sight checks of Theta* and A* PS, cleared when a wall changes
+        self.hierarchy = None  # HierarchicalMap of HPA*, built at its first run and invalidated by the wall edits
+        self.lpa_search = None  # state of the last LPA* run, repaired (instead of recomputed) by the next one
+        self.lpa_ends = None  # (start, goal) of the last LPA* run
+        self.changed_cells = []  # walls added or removed since the last LPA* run
 
         # utilities
         self.control = {"LEFT_CLICK": 1, "MIDDLE_CLICK": 2, "RIGHT_CLICK": 3,
-                        "ENTER": 13, "CTRL": 306, "SHIFT": 304, "SPACE": 32,
-                        "A": 97, "D": 100, "G": 103, "P": 112,
-                        "Q": 113, "R": 114, "S": 115, "T": 116}
+                        "UP": pygame.K_UP, "DOWN": pygame.K_DOWN, "LEFT": pygame.K_LEFT, "RIGHT": pygame.K_RIGHT,
+                        "ENTER": 13, "CTRL": pygame.K_LCTRL, "SHIFT": pygame.K_LSHIFT, "ALT": pygame.K_LALT, "SPACE": 32,
+                        "A": 97, "B": 98, "C": 99, "D": 100, "G": 103, "H": 104, "I": 105, "J": 106, "L": 108, "P": 112,
+                        "Q": 113, "R": 114, "S": 115, "T": 116, "E": 101, "W": 119}
         self.color = {"SHADOW": (192, 192, 192), "WHITE": (255, 255, 255), "LIGHTGREEN": (0, 255, 0),
                       "GREEN": (35, 250, 44), "BLUE": (0, 0, 128), "LIGHTBLUE": (0, 0, 255),
                       "RED": (220, 0, 0), "LIGHTRED": (255, 100, 100), "PURPLE": (102, 0, 102),
-                      "LIGHTPURPLE": (153, 0, 153), "BLACK": (0, 0, 0), "YELLOW": (245, 255, 137)}
+                      "LIGHTPURPLE": (153, 0, 153), "BLACK": (0, 0, 0), "YELLOW": (245, 255, 137),
+                      "ORANGE": (255, 140, 0), "BROWN": (140, 70, 20), "SAND": (194, 178, 128)}
+        self.palette = [self.color[name] for name in  # color of each cell value (see update_grid)
+                        ("WHITE", "GREEN", "BLACK", "RED", "YELLOW", "SHADOW", "LIGHTBLUE", "SAND")]
+        self.drawn_grid = None  # copy of the grid currently on the screen
+        self.drawn_paths = None  # paths currently on the screen
+        self.drawn_offset = None  # viewport offset of the drawn grid
+        self.vectorized = vectorized  # render the whole grid with array operations (draw_array) instead of draw
+        self.pixel_cells = None  # cell row (col) of each pixel row (col) of the window, used by draw_array
+        self.palette_array = np.array(self.palette + [self.color['BLACK']], dtype=np.uint8)  # + margin color
         self.gif = gif
+        self.gif_every = gif_every  # keep one gif frame every gif_every steps
+        self.map_occupancy = map_occupancy  # walls loaded from a map file (see maps.py), restored by each reset
+        self.map_terrain = map_terrain  # terrain loaded from a file (see maps.load_terrain), restored by each reset
+        self.brush_cost = 5.  # terrain cost of the cells painted with the terrain brush
+        self.compared = [('Dijkstra', "YELLOW"), ('greed_best_first', "BLUE"), ('A_star', "RED"),  # run by compare
+                         ('A_star_PS', "PURPLE"), ('Theta_star', "GREEN"), ('JPS', "LIGHTRED"),
+                         ('bidir_A_star', "LIGHTPURPLE"), ('bidir_Dijkstra', "LIGHTGREEN"), ('HPA_star', "LIGHTBLUE"),
+                         ('WA_star', "ORANGE"), ('ARA_star', "BROWN")]
+        self.improving = {}  # anytime searches (ARA*) -> their last path in self.paths, replaced by the next one
+        self.load_map()
 
     def update_grid(self, cell_type, pos, clean_grid=False):
         """
         :param clean_grid: if true update the clean grid else the current grid
-        :param cell_type: "clean", "source", "wall", "goal", "frontier", "inner", "path",
+        :param cell_type: "clean", "source", "wall", "goal", "frontier", "inner", "path", "terrain",
         :param pos: cell that should be updated
         :return: nothing. Update the grid by changing the color of the cell "pos" w.r.t. the cell_type value
         """
@@ -70,11 +116,14 @@ class world:
                     self.start = None  # deleting a source
                     self.world_is_changed = True
                 elif grid[x][y] == 2:
-                    self.wall = [cell for cell in self.wall if cell != (x, y)]
+                    self.set_wall((x, y), False)
                     self.world_is_changed = True
                 elif grid[x][y] == 3:
                     self.goal = None  # deleting a goal
                     self.world_is_changed = True
+                if self.terrain is not None and self.terrain[x, y] != 1:
+                    self.set_terrain((x, y), 1.)
+                    self.world_is_changed = True
 
             elif cell_type == 'source':
                 if self.start is None and grid[x][y] not in [2, 3]:  # don't put a source on wall(2) or goal(3)
@@ -84,7 +133,7 @@ class world:
 
             elif cell_type == 'wall':
                 if grid[x][y] not in [1, 3]:  # don't put a wall on source(1) or goal(3)
-                    self.wall.append((x, y))
+                    self.set_wall((x, y), True)
                     self.world_is_changed = True
                     value = 2
 
@@ -111,6 +160,12 @@ class world:
                 if grid[x][y] == 3:
                     value = 3
 
+            elif cell_type == 'terrain':
+                if grid[x][y] in [0, 7]:  # paint only the clean cells
+                    self.set_terrain((x, y), self.brush_cost)
+                    self.world_is_changed = True
+                    value = 7
+
             if cell_type is not None and value is not None:
                 grid[x][y] = value
 
@@ -122,36 +177,122 @@ class world:
         except IndexError:
             pass
 
+    def color_cells(self, cells, value):
+        # fast path of update_grid for the search steps: the source and the goal keep their color
+        for pos in cells:
+            if pos != self.start and pos != self.goal:
+                self.curr_grid[pos] = value
+
+    def set_wall(self, pos, is_wall):
+        if self.occupancy[pos] != is_wall:
+            self.occupancy[pos] = is_wall
+            if self.neighbours is not None:
+                self.neighbours.update(pos)
+            if self.hierarchy is not None:
+                self.hierarchy.update(pos)
+            self.sight.clear()
+            if self.lpa_search is not None:
+                self.changed_cells.append(pos)
+
+    def set_terrain(self, pos, cost):
+        if self.terrain is None:
+            if cost == 1:
+                return
+            # first painted cell: the hierarchy is rebuilt with the terrain at the next run
+            self.terrain = self.scratch_array('terrain', np.float32) if self.memmap is not None else \
+                np.empty([self.H, self.W], dtype=np.float32)
+            self.terrain[:] = 1
+            self.min_cost = 1.
+            self.hierarchy = None
+            self.lpa_search = None
+        if self.terrain[pos] != cost:
+            # the minimum is recomputed (at the next run) only if one of its cells gets more expensive
+            if self.min_cost is not None and cost < self.min_cost:
+                self.min_cost = float(cost)
+            elif self.terrain[pos] == self.min_cost:
+                self.min_cost = None
+            self.terrain[pos] = cost
+            if self.hierarchy is not None:
+                self.hierarchy.update(pos)
+            if self.lpa_search is not None:
+                self.changed_cells.append(pos)
+
     def draw(self):
-        x, y = self.MARGIN, self.MARGIN
-        for row in self.curr_grid:
-            for elem in row:
-                color = self.color['WHITE']
-                if elem == 1:
-                    color = self.color['GREEN']
-                elif elem == 2:
-                    color = self.color['BLACK']
-                elif elem == 3:
-                    color = self.color['RED']
-                elif elem == 4:
-                    color = self.color['YELLOW']
-                elif elem == 5:
-                    color = self.color['SHADOW']
-                elif elem == 6:
-                    color = self.color['LIGHTBLUE']
-                # draw the cell
-                pygame.draw.rect(self.screen, color, [x, y, self.PIXELS, self.PIXELS])
-                x += self.PIXELS + self.MARGIN
-            y += self.PIXELS + self.MARGIN
-            x = self.MARGIN
+        """
+        Repaint only the cells that changed since the last frame (all of them if the paths have changed).
+        :return: list of the screen rects that have been repainted
+        """
+        paths = [id(path) for path, _ in self.paths]
+        view = self.view()
+        if self.drawn_grid is None or self.drawn_grid.shape != view.shape or paths != self.drawn_paths \
+                or self.offset != self.drawn_offset:
+            self.screen.fill(self.color['BLACK'])
+            cells = np.ndindex(*view.shape)
+            rects = [self.screen.get_rect()]
+        else:
+            cells = np.argwhere(view != self.drawn_grid).tolist()
+            rects = []
+
+        for x, y in cells:
+            rect = pygame.draw.rect(self.screen, self.palette[view[x, y]],
+                                    [self.MARGIN + y * (self.PIXELS + self.MARGIN),
+                                     self.MARGIN + x * (self.PIXELS + self.MARGIN),
+                                     self.PIXELS, self.PIXELS])
+            rects.append(rect)
+
+        # the paths are drawn over the cells: redraw them if some cell below may have been repainted
+        if len(rects) > 0:
+            rects += self.draw_path()
+        self.drawn_grid = view.copy()
+        self.drawn_paths = paths
+        self.drawn_offset = list(self.offset)
+        return rects
+
+    def draw_array(self):
+        """
+        Render the whole grid with a few array operations: each pixel of the window looks up the value of its cell
+        (or the margin) and the palette gives its color. The frame is then copied to the screen in one blit.
+        :return: list of the screen rects that have been repainted
+        """
+        if self.pixel_cells is None:
+            self.pixel_cells = (self.pixel_index(self.VH, self.WINDOW_SIZE[1]),
+                                self.pixel_index(self.VW, self.WINDOW_SIZE[0]))
+        rows, cols = self.pixel_cells
+
+        # the extra row and column of the padded grid point to the margin color (the last one of the palette)
+        padded = np.full([self.VH + 1, self.VW + 1], len(self.palette), dtype=np.int8)
+        padded[:-1, :-1] = self.view()
+        frame = self.palette_array[padded[np.ix_(rows, cols)].T]  # surfarray is indexed (x, y) = (col, row)
+        pygame.surfarray.blit_array(self.screen, frame)
+
         self.draw_path()
+        return [self.screen.get_rect()]
+
+    def pixel_index(self, cells, pixels):
+        # cell of each pixel along one axis of the window; the pixels of the margins point to the extra cell "cells"
+        pos = np.arange(pixels) - self.MARGIN
+        index = pos // (self.PIXELS + self.MARGIN)
+        inside = (pos >= 0) & (pos % (self.PIXELS + self.MARGIN) < self.PIXELS) & (index < cells)
+        return np.where(inside, index, cells)
+
+    def view(self):
+        # part of the current grid shown in the viewport
+        x, y = self.offset
+        return self.curr_grid[x:x + self.VH, y:y + self.VW]
+
+    def pan(self, rows, cols):
+        # move the viewport over the map, without crossing its borders
+        self.offset = [min(max(self.offset[0] + rows, 0), self.H - self.VH),
+                       min(max(self.offset[1] + cols, 0), self.W - self.VW)]
 
     def draw_path(self):
         closed = False
         width = 10
+        rects = []
         for path, color in self.paths:
-            pointlist = np.asarray([pos[::-1] for pos in path]) * (self.MARGIN + self.PIXELS) + (self.PIXELS / 2)
-            pygame.draw.lines(self.screen, color, closed, pointlist, width)
+            pointlist = (np.asarray(path) - self.offset)[:, ::-1] * (self.MARGIN + self.PIXELS) + (self.PIXELS / 2)
+            rects.append(pygame.draw.lines(self.screen, color, closed, pointlist, width))
+        return rects
 
     def best_run(self, ever=False):
         if not ever:
@@ -229,13 +370,64 @@ class world:
             self.goal = None
             self.start = None
             self.paths = []
-            self.wall = []
-            self.clean_grid = np.zeros([self.H, self.W], dtype=np.int8)
-            self.curr_grid = self.clean_grid
+            self.load_map()
+
+    def load_map(self):
+        # empty world, the walls of the loaded map, or working copies of the memory-mapped map
+        self.neighbours = None
+        self.hierarchy = None
+        self.sight.clear()
+        self.lpa_search = None
+        if self.memmap is not None:
+            source = np.load(self.memmap, mmap_mode='r')  # walls as a boolean array or a world grid
+            self.clean_grid = copy_rows(source, self.scratch_array('clean_grid', np.int8),
+                                        lambda rows: world_grid(get_occupancy(rows)))
+            self.occupancy = copy_rows(self.clean_grid, self.scratch_array('occupancy', bool),
+                                       lambda rows: rows == 2)
+        else:
+            if self.map_occupancy is None:
+                self.occupancy = np.zeros([self.H, self.W], dtype=bool)
+            else:
+                self.occupancy = self.map_occupancy.copy()
+            self.clean_grid = world_grid(self.occupancy)
+        self.terrain = None
+        self.min_cost = 1.
+        if self.map_terrain is not None:
+            if self.memmap is not None:
+                self.terrain = copy_rows(self.map_terrain, self.scratch_array('terrain', np.float32))
+            else:
+                self.terrain = np.array(self.map_terrain, dtype=np.float32)
+            # the free cells with a terrain cost are drawn as terrain cells (by blocks of rows, as copy_rows)
+            for begin in range(0, self.H, 1024):
+                grid = self.clean_grid[begin:begin + 1024]
+                grid[(self.terrain[begin:begin + 1024] != 1) & (grid == 0)] = 7
+            self.min_cost = float(self.terrain.min())
+        self.curr_grid = self.clean_grid
+
+    def scratch_array(self, name, dtype):
+        """
+        :return: new array of the size of the map, memory-mapped to a file of the scratch directory
+        """
+        if self.scratch is None:
+            self.scratch = tempfile.TemporaryDirectory()  # removed at exit
+        path = os.path.join(self.scratch.name, name + '.npy')
+        if os.path.exists(path):
+            os.remove(path)  # a previous array may still map the old file: it stays valid until released
+        return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(self.H, self.W))
+
+    def copy_clean_grid(self):
+        """
+        :return: copy of the clean grid, to be colored by a search. For a memory-mapped map this is a copy-on-write
+        mapping of the clean grid file: only the pages colored by the search take memory
+        """
+        if self.memmap is None:
+            return self.clean_grid.copy()
+        return np.load(self.clean_grid.filename, mmap_mode='c')
 
     def set_the_env(self):
         drag = False  # flag used for wall-cells creation and cells cleaning
         clean = False  # flag used for cleaning the entire grid
+        paint = False  # flag used for terrain painting
         # The clean_grid stores only source, goal and walls cells. Useful for cleaning
         while True:
             # capture the pygame events
@@ -257,7 +449,11 @@ class world:
                         drag = False
                         # self.reset_world('soft')
 
-                    # A, D, P, G, T, S released: apply the selected algorithm
+                    # ALT released: end of terrain painting phase
+                    if event.key == self.control["ALT"]:
+                        paint = False
+
+                    # A, D, P, G, T, J, B, I, L, H, W, E, C, S released: apply the selected algorithm (C: all of them)
                     if event.key == self.control["A"]:
                         self.algorithm('A_star', self.color["RED"])
                     if event.key == self.control["D"]:
@@ -268,6 +464,22 @@ class world:
                         self.algorithm('greed_best_first', self.color["BLUE"])
                     if event.key == self.control["T"]:
                         self.algorithm('Theta_star', self.color["GREEN"])
+                    if event.key == self.control["J"]:
+                        self.algorithm('JPS', self.color["LIGHTRED"])
+                    if event.key == self.control["B"]:
+                        self.algorithm('bidir_A_star', self.color["LIGHTPURPLE"])
+                    if event.key == self.control["I"]:
+                        self.algorithm('bidir_Dijkstra', self.color["LIGHTGREEN"])
+                    if event.key == self.control["L"]:
+                        self.algorithm('LPA_star', self.color["BLUE"])
+                    if event.key == self.control["H"]:
+                        self.algorithm('HPA_star', self.color["LIGHTBLUE"])
+                    if event.key == self.control["W"]:
+                        self.algorithm('WA_star', self.color["ORANGE"])
+                    if event.key == self.control["E"]:
+                        self.algorithm('ARA_star', self.color["BROWN"])
+                    if event.key == self.control["C"]:
+                        self.compare()
                     if event.key == self.control["S"]:
                         pygame.image.save(self.screen, '{}.png'.format(self.caption))
 
@@ -283,6 +495,11 @@ class world:
                         drag = True
                         self.reset_world('soft')
 
+                    # ALT pressed: allow terrain painting phase
+                    if event.key == self.control["ALT"]:
+                        paint = True
+                        self.reset_world('soft')
+
                     # R released: restart the scenario keeping the source, goal and walls
                     if event.key == self.control["R"]:
                         self.reset_world('soft')
@@ -291,6 +508,16 @@ class world:
                     if event.key == self.control["Q"]:
                         self.reset_world('hard')
 
+                    # arrows: move the viewport by half of its size (maps larger than the window)
+                    if event.key == self.control["UP"]:
+                        self.pan(-(self.VH // 2), 0)
+                    if event.key == self.control["DOWN"]:
+                        self.pan(self.VH // 2, 0)
+                    if event.key == self.control["LEFT"]:
+                        self.pan(0, -(self.VW // 2))
+                    if event.key == self.control["RIGHT"]:
+                        self.pan(0, self.VW // 2)
+
                 # when a mouse button is pressed
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     if event.button in [self.control["LEFT_CLICK"], self.control["RIGHT_CLICK"]]:
@@ -307,9 +534,12 @@ class world:
                         self.paths = []  # clean the already drawn paths
                     if clean:
                         cell_type = 'clean'
+                    if paint:
+                        cell_type = 'terrain'
+                        self.paths = []
                     if cell_type is not None:
                         # update both the current and the previous grid
-                        pos = np.asarray(event.pos)[::-1] // (self.PIXELS + self.MARGIN)
+                        pos = np.asarray(event.pos)[::-1] // (self.PIXELS + self.MARGIN) + self.offset
                         self.update_grid(cell_type, pos, clean_grid=True)  # update the clean_grid
                         self.update_grid(cell_type, pos, clean_grid=False)  # update the current grid
 
@@ -333,106 +563,106 @@ class world:
                             cell_type = 'goal'
 
                     # update both the current and the previous grid
-                    pos = np.asarray(event.pos)[::-1] // (self.PIXELS + self.MARGIN)
+                    pos = np.asarray(event.pos)[::-1] // (self.PIXELS + self.MARGIN) + self.offset
                     self.update_grid(cell_type, pos, clean_grid=False)  # update the clean_grid
                     self.update_grid(cell_type, pos, clean_grid=True)  # update the current grid
 
             self.update_screen()
 
     def update_screen(self):
-        self.screen.fill(self.color['BLACK'])
-        self.draw()
+        rects = self.draw_array() if self.vectorized else self.draw()
         pygame.display.set_caption(self.caption)
-        pygame.display.flip()
+        pygame.display.update(rects)
         self.clock.tick(self.update_speed)
 
-    def step(self, data_algo, algorithm, color):
-        done = False
-        if (algorithm is 'A_star') or (algorithm is 'A_star_PS'):
-            data_algo['frontier'], data_algo['inner'], data_algo['g_score'], data_algo['come_from'] = A_star(
-                self.curr_grid,
-                self.wall,
-                self.goal,
-                data_algo['h'],
-                data_algo['frontier'],
-                data_algo['inner'],
-                data_algo['g_score'],
-                data_algo['f_score'],
-                data_algo['come_from'])
-        if algorithm is 'Dijkstra':
-            data_algo['frontier'], data_algo['inner'], data_algo['g_score'], data_algo['come_from'] = Dijkstra(
-                self.curr_grid,
-                self.wall, self.goal,
-                data_algo['frontier'],
-                data_algo['inner'],
-                data_algo['g_score'],
-                data_algo['come_from'])
-        if algorithm is 'greed_best_first':
-            data_algo['frontier'], data_algo['inner'], data_algo['come_from'] = greed_best_first(self.curr_grid,
-                                                                                                 self.wall,
-                                                                                                 self.goal,
-                                                                                                 data_algo['h'],
-                                                                                                 data_algo['frontier'],
-                                                                                                 data_algo['inner'],
-                                                                                                 data_algo['come_from'])
-        if algorithm is 'Theta_star':
-            data_algo['frontier'], data_algo['inner'], data_algo['g_score'], data_algo['come_from'] = Theta_star(
-                self.curr_grid,
-                self.wall,
-                self.start,
-                self.goal,
-                data_algo['h'],
-                data_algo['frontier'],
-                data_algo['inner'],
-                data_algo['g_score'],
-                data_algo['f_score'],
-                data_algo['come_from'])
-
-        # color the grid cells according to step updates
-        if data_algo['frontier'] is None:  # path has been found
-            if algorithm is 'A_star_PS':
-                data_algo['come_from'] = post_smoothing(data_algo['come_from'], self.wall)
-            for pos in data_algo['come_from']:
-                self.update_grid('path', pos, clean_grid=False)
-
-            self.paths.append([data_algo['come_from'], color])
-            done = True
-        else:
-            for pos in data_algo['frontier']:
-                if (pos is not self.start) and (pos is not self.goal):
-                    self.update_grid('frontier', pos, clean_grid=False)
-            for pos in data_algo['inner']:
-                if (pos is not self.start) and (pos is not self.goal):
-                    self.update_grid('inner', pos, clean_grid=False)
+    def step(self, events, color):
+        """
+        Advance a search (generator of engine.search) by one step.
+        :return: done (the search has finished), found (a path has been found and drawn) and the suboptimality
+                 bound of the path found by an anytime search that goes on (None for a final path)
+        """
+        try:
+            event = next(events)
+        except StopIteration as stop:
+            path = stop.value
+            # the last path of an anytime search replaces its previous ones
+            previous = self.improving.pop(events, None)
+            if previous is not None:
+                self.paths.remove(previous)
+            if path is not None:  # path has been found
+                for pos in path:
+                    self.update_grid('path', pos, clean_grid=False)
+                self.paths.append([path, color])
+            return True, path is not None, None
+
+        # recolor only the nodes closed and opened by this step
+        self.color_cells(event.opened, 4)
+        self.color_cells(event.closed, 5)
+
+        # improved path of an anytime search: drawn (over its previous one) while the search goes on
+        if event.path is not None:
+            previous = self.improving.get(events)
+            if previous is not None:
+                self.paths.remove(previous)
+            self.improving[events] = [event.path, color]
+            self.paths.append(self.improving[events])
+            return False, True, event.bound
+        return False, False, None
+
+    def report(self, algorithm, steps, bound=None):
+        # line of the results table of the last path found (an intermediate path is labelled with its bound)
+        label = algorithm if bound is None else '{}(e={:.2f})'.format(algorithm, bound)
+        self.print_this, self.printed_infos = \
+            build_print_line(label, steps, self.paths, self.run_num, self.printed_infos)
+        self.caption = self.print_this
+
+    def start_search(self, algorithm):
+        """
+        :return: data_algo, the initial state of a search with the selected algorithm on the current world
+        """
+        # avoid increment when algorithm is applied two times on the same world
+        if not self.applied_this_run[algorithm]:
+            self.algorithm_runs[algorithm] += 1
+        self.applied_this_run[algorithm] = True
 
-        return data_algo, done
+        # (no neighbour table for a memory-mapped map, it would take 32 bytes per cell)
+        if self.neighbours is None and self.memmap is None:
+            self.neighbours = NeighbourTable(self.occupancy)
+        if self.terrain is not None and self.min_cost is None:
+            self.min_cost = float(self.terrain.min())
+        if algorithm == 'HPA_star' and self.hierarchy is None:
+            self.hierarchy = HierarchicalMap(self.occupancy, terrain=self.terrain)
+        if algorithm == 'LPA_star' and self.lpa_search is not None and self.lpa_ends == (self.start, self.goal):
+            # same start and goal as the last LPA* run: repair its search around the edited walls
+            data_algo = repair_search(self.lpa_search, self.occupancy, self.start, self.changed_cells)
+        else:
+            data_algo = init_search(algorithm, self.occupancy, self.start, self.goal, table=self.neighbours,
+                                    hierarchy=self.hierarchy, sight=self.sight, terrain=self.terrain,
+                                    min_cost=self.min_cost)
+        if algorithm == 'LPA_star':
+            self.lpa_search, self.lpa_ends, self.changed_cells = data_algo, (self.start, self.goal), []
+        return data_algo
 
     def algorithm(self, algorithm, color):
         if self.start is None or self.goal is None:
-            self.curr_grid = self.clean_grid.copy()
+            self.curr_grid = self.copy_clean_grid()
             return
 
         self.reset_world('soft', new_run=True, keep_paths=True)
-
-        # avoid increment when algorithm is applied two times on the same world
-        if not self.applied_this_run[algorithm]:
-            self.algorithm_runs[algorithm] += 1
-        self.applied_this_run[algorithm] = True
-
-        start = self.start
-        goal = self.goal
-        h = heuristic(self.clean_grid, goal)
-        data_algo = {'h': h,
-                     'frontier': {start},
-                     'inner': set(),
-                     'g_score': {start: 0},
-                     'f_score': {start: h[start]},
-                     'come_from': {start: None}}
+        events = search(algorithm, self.occupancy, self.start, self.goal, data_algo=self.start_search(algorithm))
         steps = 0
+        done = found = False
 
-        self.curr_grid = self.clean_grid.copy()
+        self.curr_grid = self.copy_clean_grid()
 
-        while len(data_algo['frontier']) > 0:
+        # the frames are streamed to a file named after the run, the algorithm, the time and the process
+        gif = None
+        if self.gif and not self.step_by_step:
+            gif = GifWriter('./{}_{}_{}_{}.gif'.format(self.run_num, algorithm, time.strftime('%Y%m%d-%H%M%S'),
+                                                       os.getpid()),
+                            list(self.color.values()), every=self.gif_every)
+
+        while not done:
 
             if self.step_by_step:
 
@@ -451,35 +681,93 @@ class world:
                         if event.type == pygame.KEYDOWN and event.key == self.control["SPACE"]:
 
                             # apply one step of the selected algorithm
-                            data_algo, done = self.step(data_algo, algorithm, color)
-                            steps += 1
+                            done, found, bound = self.step(events, color)
+                            steps += not done or found
 
-                            if done:
-                                self.print_this, self.printed_infos = \
-                                    build_print_line(algorithm, steps, self.paths, self.run_num, self.printed_infos)
-                                self.caption = self.print_this
+                            if found:
+                                self.report(algorithm, steps, bound)
+                            if found and done:
                                 return
 
             else:
 
-                data_algo, done = self.step(data_algo, algorithm, color)
-                steps += 1
+                done, found, bound = self.step(events, color)
+                steps += not done or found
 
-                if done:
-                    self.print_this, self.printed_infos = \
-                        build_print_line(algorithm, steps, self.paths, self.run_num, self.printed_infos)
-                    self.caption = self.print_this
+                if found:
+                    self.report(algorithm, steps, bound)
+                if found and done:
                     self.update_screen()
-                    if self.gif:
-                        pygame.image.save(self.screen, './temp/{}.bmp'.format(steps))
-                        create_gif(self.run_num, algorithm)
+                    if gif is not None:
+                        gif.add(self.screen_frame(), last=True)
+                    return
+
+            self.update_screen()
+            if gif is not None:
+                gif.add(self.screen_frame())
 
+        # the search has ended without a path: the goal cannot be reached
+        if gif is not None:
+            gif.close()
 
-                    return
+    def compare(self):
+        """
+        Run all the algorithms of self.compared together on the same grid: each round advances every search by one
+        step, and a search leaves the round as soon as it has finished (its line of the table is printed then).
+        The frontiers and inner cells of all the searches are overlaid, the paths are drawn in the algorithm colors.
+        """
+        if self.start is None or self.goal is None:
+            self.curr_grid = self.copy_clean_grid()
+            return
+
+        self.reset_world('soft', new_run=True, keep_paths=True)
+        searches = [{'algorithm': algorithm, 'color': self.color[color], 'steps': 0,
+                     'events': search(algorithm, self.occupancy, self.start, self.goal,
+                                      data_algo=self.start_search(algorithm))}
+                    for algorithm, color in self.compared]
+        self.curr_grid = self.copy_clean_grid()
+
+        gif = None
+        if self.gif and not self.step_by_step:
+            gif = GifWriter('./{}_compare_{}_{}.gif'.format(self.run_num, time.strftime('%Y%m%d-%H%M%S'),
+                                                           os.getpid()),
+                            list(self.color.values()), every=self.gif_every)
+
+        while len(searches) > 0:
+
+            # step by step: a round is played when SPACE is pressed
+            if self.step_by_step:
+                advance = False
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        sys.exit(0)
+                    if event.type == pygame.KEYDOWN and event.key == self.control["R"]:
+                        self.paths = []
+                        self.curr_grid = self.clean_grid
+                        return
+                    if event.type == pygame.KEYDOWN and event.key == self.control["SPACE"]:
+                        advance = True
+                if not advance:
+                    self.update_screen()
+                    continue
+
+            for running in list(searches):
+                done, found, bound = self.step(running['events'], running['color'])
+                running['steps'] += not done or found
+                if found:
+                    self.report(running['algorithm'], running['steps'], bound)
+                if done:
+                    searches.remove(running)  # found, or the goal cannot be reached
 
             self.update_screen()
-            if self.gif:
-                pygame.image.save(self.screen, './temp/{}.bmp'.format(steps))
+            if gif is not None:
+                gif.add(self.screen_frame(), last=len(searches) == 0)
+
+        if gif is not None:
+            gif.close()
+
+    def screen_frame(self):
+        return Image.frombytes('RGB', self.screen.get_size(), pygame.image.tostring(self.screen, 'RGB'))
 
     def run(self):
         pygame.init()
@@ -490,8 +778,7 @@ class world:
         while repeat:
             self.start = None
             self.goal = None
-            self.clean_grid = np.zeros([self.H, self.W], dtype=np.int8)
-            self.curr_grid = self.clean_grid
+            self.load_map()
             repeat = self.set_the_env()
 
         return 1